@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from instrumentation import ASSET_OPEN, FIT, stats
+
+# (path, mtime_ns, target size, resample filter, fit mode)
+CacheKey = Tuple[str, int, Tuple[int, int], int, str]
+
+FIT_MODES = ("fit", "contain", "stretch")
+
+
+def _image_bytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+def _prepare_layer(path: str, size: Tuple[int, int], resample: int, mode: str, pyramids: Any = None) -> Image.Image:
+    with stats.stage(ASSET_OPEN):
+        # A memory-mapped pyramid level replaces decoding the file when one is available;
+        # "fit" and "contain" shrink the image to fit inside the canvas first
+        image = pyramids.source(path, size, mode != "stretch") if pyramids is not None else None
+        if image is None:
+            image = Image.open(path).convert("RGBA")
+    with stats.stage(FIT):
+        return _fit_layer(image, size, resample, mode)
+
+
+def _fit_layer(image: Image.Image, size: Tuple[int, int], resample: int, mode: str) -> Image.Image:
+    if mode == "fit":
+        # Same steps the preview has always used: thumbnail first, then crop-fit to the canvas
+        image.thumbnail(size, resample)
+        return ImageOps.fit(image, size, resample)
+    if mode == "contain":
+        # Keep the aspect ratio and center the image on a transparent canvas
+        aspect_ratio = image.width / image.height
+        if aspect_ratio > size[0] / size[1]:
+            new_size = (size[0], max(1, int(size[0] / aspect_ratio)))
+        else:
+            new_size = (max(1, int(size[1] * aspect_ratio)), size[1])
+        image = image.resize(new_size, resample)
+        canvas = Image.new('RGBA', size, (255, 255, 255, 0))
+        canvas.paste(image, ((size[0] - new_size[0]) // 2, (size[1] - new_size[1]) // 2), image)
+        return canvas
+    if mode == "stretch":
+        return image.resize(size, resample)
+    raise ValueError(f"Unknown fit mode: {mode}")
+
+
+class AssetCache:
+    """LRU cache of decoded, resized RGBA layers bounded by a byte budget.
+
+    Cached images are shared between callers and must be treated as read-only;
+    copy them before calling in-place operations such as ``putalpha``.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, pyramids: Any = None):
+        self.max_bytes = max_bytes
+        # Optional material_pyramid.PyramidStore consulted before decoding an image file
+        self.pyramids = pyramids
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[CacheKey, Image.Image]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, path: str, size: Tuple[int, int], resample: int = Image.LANCZOS, mode: str = "fit") -> Image.Image:
+        if mode not in FIT_MODES:
+            raise ValueError(f"Unknown fit mode: {mode}")
+        key: CacheKey = (os.path.abspath(path), os.stat(path).st_mtime_ns, tuple(size), int(resample), mode)
+        return self.get_or_build(key, lambda: _prepare_layer(path, tuple(size), resample, mode, self.pyramids))
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Image.Image]) -> Image.Image:
+        # Derived layers (masks, proxies) share the budget; keys starting with the
+        # source's absolute path are dropped together with it by invalidate()
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        image = build()
+        self.put(key, image)
+        return image
+
+    def put(self, key: Hashable, image: Image.Image) -> None:
+        size = _image_bytes(image)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= _image_bytes(self._entries.pop(key))
+            if size > self.max_bytes:
+                # Larger than the whole budget: hand it out but do not keep it
+                return
+            self._entries[key] = image
+            self.current_bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, image = self._entries.popitem(last=False)
+            self.current_bytes -= _image_bytes(image)
+            self.evictions += 1
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def invalidate(self, path: Optional[str] = None) -> int:
+        # Drop every entry for ``path`` (or everything when no path is given)
+        with self._lock:
+            if path is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self.current_bytes = 0
+                return removed
+            abspath = os.path.abspath(path)
+            stale = [key for key in self._entries if isinstance(key, tuple) and key[0] == abspath]
+            for key in stale:
+                self.current_bytes -= _image_bytes(self._entries.pop(key))
+            return len(stale)
+
+    def invalidate_stale(self) -> int:
+        # Drop entries whose source file was modified or removed since it was cached
+        with self._lock:
+            keys = [key for key in self._entries if isinstance(key, tuple) and len(key) > 1]
+        stale = []
+        for key in keys:
+            try:
+                if os.stat(key[0]).st_mtime_ns != key[1]:
+                    stale.append(key)
+            except OSError:
+                stale.append(key)
+        with self._lock:
+            for key in stale:
+                image = self._entries.pop(key, None)
+                if image is not None:
+                    self.current_bytes -= _image_bytes(image)
+        return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+default_cache = AssetCache()
@@ -0,0 +1,84 @@
+import argparse
+import os
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+from PIL import Image, ImageChops, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import masks
+from benchmarks.synthetic import synthetic_design
+
+# 540x540 preview and roughly 300 DPI for a 75x150 mm case
+SIZES: List[Tuple[int, int]] = [(540, 540), (886, 1772), (1800, 3600)]
+
+
+def pil_dark_mask(image: Image.Image) -> Image.Image:
+    return image.convert("L").point(lambda x: 255 if x < 128 else 0)
+
+
+def pil_camera_mask(image: Image.Image) -> Image.Image:
+    image = image.convert("L")
+    blurred = image.filter(ImageFilter.GaussianBlur(radius=2))
+    circles = blurred.point(lambda p: 255 if p < 128 else 0)
+    circles = circles.filter(ImageFilter.MinFilter(3))
+    circles = circles.filter(ImageFilter.MaxFilter(3))
+    circles = circles.filter(ImageFilter.GaussianBlur(radius=2))
+    return circles.point(lambda p: 255 if p < 128 else 0)
+
+
+def pil_morphology(mask: Image.Image) -> Image.Image:
+    return mask.filter(ImageFilter.MinFilter(3)).filter(ImageFilter.MaxFilter(3))
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def run(repeat: int) -> List[Dict[str, object]]:
+    results = []
+    for size in SIZES:
+        design = synthetic_design(size)
+        other = synthetic_design(size, seed=1)
+        mask = pil_dark_mask(design)
+        other_mask = pil_dark_mask(other)
+        mask_array, other_array = masks.to_array(mask), masks.to_array(other_mask)
+
+        # The array versions must produce the same pixels as the PIL originals
+        assert masks.dark_mask(design).tobytes() == mask.tobytes()
+        assert masks.to_image(masks.dilate(masks.erode(mask_array))).tobytes() == pil_morphology(mask).tobytes()
+        assert masks.camera_blob_mask(design).tobytes() == pil_camera_mask(design).tobytes()
+
+        cases = [
+            ("threshold", lambda: pil_dark_mask(design), lambda: masks.dark_mask(design)),
+            ("morphology", lambda: pil_morphology(mask), lambda: masks.dilate(masks.erode(mask_array))),
+            ("combine", lambda: ImageChops.darker(mask, other_mask), lambda: masks.combine(mask_array, other_array)),
+            ("camera_mask", lambda: pil_camera_mask(design), lambda: masks.camera_blob_mask(design)),
+        ]
+        for name, before, after in cases:
+            pil_time = best_of(before, repeat)
+            numpy_time = best_of(after, repeat)
+            results.append({
+                "size": f"{size[0]}x{size[1]}",
+                "stage": name,
+                "pil_ms": round(pil_time * 1000, 3),
+                "numpy_ms": round(numpy_time * 1000, 3),
+                "speedup": round(pil_time / numpy_time, 2) if numpy_time else float("inf"),
+            })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare PIL point/filter masks with the NumPy mask engine")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'stage':>12} {'PIL ms':>10} {'NumPy ms':>10} {'speedup':>8}")
+    for row in run(args.repeat):
+        print(f"{row['size']:>10} {row['stage']:>12} {row['pil_ms']:>10} {row['numpy_ms']:>10} {row['speedup']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import ctypes
+import ctypes.util
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import PIL
+from PIL import Image, ImageOps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import masks
+from asset_cache import AssetCache
+from benchmarks.synthetic import synthetic_design, synthetic_material, synthetic_photo
+from compositor import LayeredCompositor
+from export import export_print, print_size
+from import_store import make_proxy
+from render import RenderSpec
+
+# 540x540 preview, 75x150 mm at 300 DPI and at 600 DPI
+SIZES: Dict[str, Tuple[int, int]] = {
+    "preview": (540, 540),
+    "print300": print_size(dpi=300),
+    "print600": print_size(dpi=600),
+}
+
+
+class PeakMemory:
+    """Peak resident memory above the starting point while the block runs.
+
+    PIL allocates pixel buffers outside the Python heap, so RSS is sampled from
+    /proc on Linux; elsewhere tracemalloc (Python allocations only) is used.
+    Freed heap memory is handed back to the OS first (malloc_trim) so that a
+    stage reusing pages from the previous run still shows up as growth.
+    """
+
+    _libc = ctypes.CDLL(ctypes.util.find_library("c")) if ctypes.util.find_library("c") else None
+
+    def __init__(self, interval: float = 0.0005):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._use_proc = os.path.exists("/proc/self/statm")
+        self._page = os.sysconf("SC_PAGE_SIZE") if self._use_proc else 1
+
+    def _rss(self) -> int:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * self._page
+
+    def _sample(self) -> None:
+        while not self._done.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._rss() - self._start)
+            self._done.wait(self.interval)
+
+    def __enter__(self) -> "PeakMemory":
+        if self._use_proc:
+            Image.core.clear_cache()
+            if self._libc is not None and hasattr(self._libc, "malloc_trim"):
+                self._libc.malloc_trim(0)
+            self._start = self._rss()
+            self._done = threading.Event()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        else:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._use_proc:
+            self._done.set()
+            self._thread.join()
+            self.peak_bytes = max(self.peak_bytes, self._rss() - self._start)
+        else:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    func()  # warm-up, also fills OS file caches
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        peak = max(peak, memory.peak_bytes)
+    return {
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+        "peak_mb": round(peak / 1e6, 2),
+    }
+
+
+def photoimage_converter() -> Tuple[str, Callable[[Image.Image], object]]:
+    # Real ImageTk conversion needs a display; headless runs time the equivalent buffer copy
+    try:
+        import tkinter as tk
+        from PIL import ImageTk
+        root = tk.Tk()
+        root.withdraw()
+        return "tk", lambda image: ImageTk.PhotoImage(image, master=root)
+    except Exception:
+        return "proxy", lambda image: image.tobytes()
+
+
+def run(sizes: Dict[str, Tuple[int, int]], repeat: int, workdir: str) -> Dict[str, Dict[str, float]]:
+    photoimage_mode, to_photoimage = photoimage_converter()
+    results: Dict[str, Dict[str, float]] = {}
+    for label, size in sizes.items():
+        # Sources are larger than the canvas, as real design and photo files are
+        source_size = (size[0] * 3 // 2, size[1] * 3 // 2)
+        design_path = os.path.join(workdir, f"design_{label}.png")
+        material_path = os.path.join(workdir, f"material_{label}.png")
+        photo_path = os.path.join(workdir, f"photo_{label}.jpg")
+        synthetic_design(source_size).save(design_path)
+        synthetic_material(source_size).save(material_path)
+        synthetic_photo((source_size[0] * 2, source_size[1] * 2)).save(photo_path, quality=90)
+
+        design = Image.open(design_path).convert("RGBA")
+        layer = ImageOps.fit(design, size, Image.LANCZOS)
+        custom_img = make_proxy(photo_path, size)
+
+        def composite() -> Image.Image:
+            # Cold cache: decode, fit, mask and composite every layer
+            compositor = LayeredCompositor(size, AssetCache())
+            compositor.set_design(design_path)
+            compositor.set_material(material_path)
+            compositor.set_custom_image(custom_img)
+            return compositor.render()
+
+        final = composite()
+        spec = RenderSpec(design=design_path, material=material_path, size=size)
+        export_path = os.path.join(workdir, f"export_{label}.png")
+
+        stages: Dict[str, Callable[[], object]] = {
+            "decode": lambda: Image.open(design_path).load(),
+            "resize": lambda: ImageOps.fit(design, size, Image.LANCZOS),
+            "mask": lambda: (masks.dark_mask(layer), masks.camera_blob_mask(layer)),
+            "composite": composite,
+            "photoimage": lambda: to_photoimage(final),
+            "jpeg_encode": lambda: final.convert("RGB").save(io.BytesIO(), "JPEG", quality=95),
+            "import": lambda: make_proxy(photo_path, size),
+            "export": lambda: export_print(spec, export_path, size, custom_path=photo_path,
+                                           resolve=lambda kind, name: name),
+        }
+        for stage, func in stages.items():
+            results[f"{label}/{stage}"] = measure(func, repeat)
+        results[f"{label}/photoimage"]["mode"] = photoimage_mode
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float,
+            min_ms: float, memory_threshold: float, min_mb: float) -> Tuple[List[str], List[str]]:
+    # A stage regresses when its median or its peak memory is both relatively and absolutely worse
+    # than the baseline. Stages measured differently (photoimage with and without Tk) are skipped
+    regressions, skipped = [], []
+    for key, current in sorted(results.items()):
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if current.get("mode") != before.get("mode"):
+            skipped.append(f"{key}: measured in {current.get('mode')} mode, baseline in {before.get('mode')} mode")
+            continue
+        limit = before["p50_ms"] * (1 + threshold)
+        if current["p50_ms"] > limit and current["p50_ms"] - before["p50_ms"] > min_ms:
+            regressions.append(f"{key}: p50 {current['p50_ms']} ms vs baseline {before['p50_ms']} ms (limit {limit:.3f} ms)")
+        limit = before["peak_mb"] * (1 + memory_threshold)
+        if current["peak_mb"] > limit and current["peak_mb"] - before["peak_mb"] > min_mb:
+            regressions.append(f"{key}: peak {current['peak_mb']} MB vs baseline {before['peak_mb']} MB (limit {limit:.2f} MB)")
+    return regressions, skipped
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the preview, mask, import and export paths")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Stored results to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to --baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative p50 slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed relative peak memory growth")
+    parser.add_argument("--min-mb", type=float, default=5.0, help="Ignore peak memory growth smaller than this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"Comma separated subset of {', '.join(SIZES)}")
+    args = parser.parse_args(argv)
+
+    sizes = {label: SIZES[label] for label in args.sizes.split(",")}
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(sizes, args.repeat, workdir)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+        },
+        "stages": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+
+    print(f"{'stage':<24} {'p50 ms':>10} {'p95 ms':>10} {'peak MB':>9}")
+    for key, row in results.items():
+        print(f"{key:<24} {row['p50_ms']:>10} {row['p95_ms']:>10} {row['peak_mb']:>9}")
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+        regressions, skipped = compare(results, baseline, args.threshold, args.min_ms, args.memory_threshold, args.min_mb)
+        for line in skipped:
+            print(f"SKIPPED {line}", file=sys.stderr)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No stage regressed more than {args.threshold:.0%} (time) or {args.memory_threshold:.0%} (memory) "
+              f"against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_design(size: Tuple[int, int], seed: int = 0) -> Image.Image:
+    # Smooth gradients plus dark blobs, so thresholds and morphology have real edges to work on
+    rng = np.random.default_rng(seed)
+    height, width = size[1], size[0]
+    y, x = np.mgrid[0:height, 0:width]
+    data = (128 + 100 * np.sin(x / 37.0) * np.cos(y / 53.0)).astype(np.float32)
+    for _ in range(12):
+        cx, cy, r = rng.integers(0, width), rng.integers(0, height), rng.integers(10, max(11, width // 8))
+        data[(x - cx) ** 2 + (y - cy) ** 2 < r ** 2] = 10
+    return Image.fromarray(np.clip(data, 0, 255).astype(np.uint8), "L").convert("RGBA")
+
+
+def synthetic_material(size: Tuple[int, int], seed: int = 1) -> Image.Image:
+    # Noisy wood-like stripes
+    rng = np.random.default_rng(seed)
+    height, width = size[1], size[0]
+    y, x = np.mgrid[0:height, 0:width]
+    grain = 0.5 + 0.5 * np.sin(x / 9.0 + 3 * np.sin(y / 41.0))
+    noise = rng.normal(0, 0.08, (height, width))
+    base = np.clip(grain + noise, 0, 1)
+    rgb = np.stack([120 + 90 * base, 70 + 60 * base, 30 + 30 * base], axis=-1)
+    return Image.fromarray(rgb.astype(np.uint8), "RGB").convert("RGBA")
+
+
+def synthetic_photo(size: Tuple[int, int], seed: int = 2) -> Image.Image:
+    # Customer photo stand-in: colour gradients with noise, saved as JPEG by callers
+    rng = np.random.default_rng(seed)
+    height, width = size[1], size[0]
+    y, x = np.mgrid[0:height, 0:width]
+    rgb = np.stack([255 * x / width, 255 * y / height, 128 + 64 * np.sin((x + y) / 50.0)], axis=-1)
+    rgb += rng.normal(0, 12, rgb.shape)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), "RGB")
@@ -0,0 +1,180 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps
+
+import masks
+from catalog import CATALOG_PATH, AssetCatalog, find_images, load_catalog
+
+# Camera lens rectangles (x0, y0, x1, y1) on the 540x540 preview, kept in sync with main_control.gd
+CAMERA_SPECS: Dict[str, List[Tuple[int, int, int, int]]] = {
+    "iPhone 12": [(148, 45, 265, 145)],
+    "Galaxy S21": [(150, 150, 190, 190)],
+}
+
+ATLAS_PATH = "camera_atlas.bin"
+MASK_SIZE = 540
+# Designs outside the catalog: the flat layout render.asset_path still falls back to
+LEGACY_DESIGN_DIRS = ("images",)
+
+
+def spec_mask(specs: Iterable[Tuple[int, int, int, int]], size: int = MASK_SIZE) -> Image.Image:
+    mask = Image.new("L", (size, size), 255)
+    draw = ImageDraw.Draw(mask)
+    for spec in specs:
+        draw.rectangle(spec, fill="black")
+    return mask
+
+
+def detected_mask(design_path: str, size: int = MASK_SIZE) -> Image.Image:
+    # Same blob detection the preview used to run on every render
+    design_image = Image.open(design_path).convert("RGBA").resize((size, size), Image.LANCZOS)
+    mask = Image.new("L", (size, size), 255)
+    mask.paste(masks.camera_blob_mask(design_image), (0, 0))
+    return mask
+
+
+def fit_mask(mask: Image.Image, source_size: Tuple[int, int], size: Tuple[int, int]) -> Image.Image:
+    # Atlas and spec masks cover the design stretched to a square; the design layer instead keeps
+    # its aspect ratio and is thumbnailed and crop-fitted to the canvas (asset_cache "fit"), so
+    # the mask goes through the same steps from the design's own size
+    scale = min(1.0, size[0] / source_size[0], size[1] / source_size[1])
+    shrunk = (max(1, round(source_size[0] * scale)), max(1, round(source_size[1] * scale)))
+    return ImageOps.fit(mask.resize(shrunk, Image.NEAREST), size, Image.NEAREST)
+
+
+def model_key(model: str) -> str:
+    return f"model:{model}"
+
+
+def design_key(design_path: str) -> str:
+    return f"design:{os.path.normpath(design_path).replace(os.sep, '/')}"
+
+
+def _specs_digest(specs: Iterable[Tuple[int, int, int, int]]) -> str:
+    return hashlib.sha1(json.dumps([list(s) for s in specs]).encode()).hexdigest()
+
+
+def find_designs(catalog: Optional[AssetCatalog] = None, dirs: Iterable[str] = LEGACY_DESIGN_DIRS) -> List[str]:
+    # The catalog's design paths are what CaseRenderer resolves names to, so atlas keys match them
+    catalog = catalog if catalog is not None else load_catalog()
+    paths = {entry.path for entry in catalog.designs()}
+    for root_dir in dirs:
+        paths.update(find_images(root_dir))
+    return sorted(paths)
+
+
+class CameraAtlas:
+    """Precomputed 1-bit camera cutout masks in one binary file plus a JSON index.
+
+    Entries are keyed ``model:<name>`` (built from CAMERA_SPECS) or
+    ``design:<path>`` (built by blob detection). Each mask is stored as
+    ``np.packbits`` rows; 0 bits are cutouts.
+    """
+
+    def __init__(self, path: str = ATLAS_PATH):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".json"
+        self.index: Dict[str, Dict] = {}
+        self._data = b""
+        self._unpacked: Dict[str, Image.Image] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not (os.path.exists(self.path) and os.path.exists(self.index_path)):
+            return
+        with open(self.index_path, encoding="utf-8") as f:
+            self.index = json.load(f)["entries"]
+        with open(self.path, "rb") as f:
+            self._data = f.read()
+        self._unpacked.clear()
+
+    def _packed(self, key: str) -> bytes:
+        entry = self.index[key]
+        return self._data[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        image = self._unpacked.get(key)
+        if image is None:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            width, height = entry["size"]
+            bits = np.unpackbits(np.frombuffer(self._packed(key), dtype=np.uint8), count=width * height)
+            image = masks.to_image(bits.reshape(height, width) * np.uint8(255))
+            self._unpacked[key] = image
+        return image
+
+    def lookup(self, model: str, design_path: Optional[str] = None) -> Optional[Image.Image]:
+        # Explicit model specs win over detection, exactly like the old on-the-fly code
+        mask = self.get(model_key(model))
+        if mask is None and design_path is not None:
+            key = design_key(design_path)
+            entry = self.index.get(key)
+            # A design edited since the last build is treated as missing until the atlas is rebuilt
+            try:
+                if entry is None or entry["stamp"] != str(os.stat(design_path).st_mtime_ns):
+                    return None
+            except OSError:
+                return None
+            mask = self.get(key)
+        return mask
+
+    def build(self, specs: Dict[str, List[Tuple[int, int, int, int]]] = CAMERA_SPECS,
+              design_paths: Iterable[str] = (), size: int = MASK_SIZE) -> Dict[str, int]:
+        # Rebuild only entries whose specs or design file changed; reuse the rest byte for byte
+        wanted: Dict[str, Tuple[str, Callable[[], Image.Image]]] = {}
+        for model, model_specs in specs.items():
+            wanted[model_key(model)] = (_specs_digest(model_specs), lambda s=model_specs: spec_mask(s, size))
+        for design_path in design_paths:
+            stamp = str(os.stat(design_path).st_mtime_ns)
+            wanted[design_key(design_path)] = (stamp, lambda p=design_path: detected_mask(p, size))
+
+        entries: Dict[str, Dict] = {}
+        chunks: List[bytes] = []
+        offset = 0
+        counts = {"built": 0, "reused": 0, "removed": len(set(self.index) - set(wanted))}
+        for key, (stamp, make_mask) in sorted(wanted.items()):
+            old = self.index.get(key)
+            if old is not None and old["stamp"] == stamp and old["size"] == [size, size]:
+                packed = self._packed(key)
+                counts["reused"] += 1
+            else:
+                packed = np.packbits(masks.to_array(make_mask()) >= 128).tobytes()
+                counts["built"] += 1
+            entries[key] = {"offset": offset, "length": len(packed), "size": [size, size], "stamp": stamp}
+            chunks.append(packed)
+            offset += len(packed)
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.writelines(chunks)
+        os.replace(tmp_path, self.path)
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": entries}, f, indent=1, sort_keys=True)
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self.load()
+        return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the camera cutout mask atlas")
+    parser.add_argument("dirs", nargs="*", default=list(LEGACY_DESIGN_DIRS),
+                        help="Directories with design images besides the catalog's")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Asset catalog index listing the designs")
+    parser.add_argument("-o", "--output", default=ATLAS_PATH)
+    parser.add_argument("--size", type=int, default=MASK_SIZE)
+    args = parser.parse_args(argv)
+
+    counts = CameraAtlas(args.output).build(CAMERA_SPECS, find_designs(load_catalog(args.catalog), args.dirs), args.size)
+    print(f"Camera atlas {args.output}: {counts['built']} built, {counts['reused']} reused, {counts['removed']} removed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
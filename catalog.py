@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import re
+import sys
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+CATALOG_PATH = "asset_catalog.json"
+CATALOG_VERSION = 1
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# kind -> directory scanned for it
+ROOTS: Dict[str, str] = {
+    "design": "design",
+    "material": "materials",
+    "import": "imports/originals",
+}
+
+# design/<Manufacturer>/<Model>_Design<N>.png
+DESIGN_NAME = re.compile(r"^(?P<model>.+?)_(?P<design>Design\d+)$", re.IGNORECASE)
+
+
+@dataclass
+class CatalogEntry:
+    kind: str
+    name: str
+    path: str
+    mtime_ns: int
+    file_size: int
+    width: int = 0
+    height: int = 0
+    manufacturer: str = ""
+    model: str = ""
+    design: str = ""
+
+
+def _read_dimensions(path: str) -> Tuple[int, int]:
+    # Image.open only parses the header; the pixel data is never decoded here
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except OSError:
+        return 0, 0
+
+
+def _scan(root_dir: str) -> Dict[str, os.stat_result]:
+    found = {}
+    stack = [root_dir]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        found[os.path.normpath(entry.path).replace(os.sep, "/")] = entry.stat()
+        except FileNotFoundError:
+            continue
+    return found
+
+
+def find_images(root_dir: str) -> List[str]:
+    # Image files under a directory outside the catalog roots, found the way refresh() finds them
+    return sorted(_scan(root_dir))
+
+
+def _make_entry(kind: str, root_dir: str, path: str, stat: os.stat_result) -> CatalogEntry:
+    relative = os.path.relpath(path, root_dir).replace(os.sep, "/")
+    stem = os.path.splitext(relative)[0]
+    # Designs are named "<Manufacturer>/<Model>_Design<N>", materials by stem, imports by file name
+    name = relative if kind == "import" else stem
+    entry = CatalogEntry(kind=kind, name=name, path=path, mtime_ns=stat.st_mtime_ns, file_size=stat.st_size)
+    if kind == "design":
+        parts = stem.split("/")
+        entry.manufacturer = parts[0] if len(parts) > 1 else ""
+        match = DESIGN_NAME.match(parts[-1])
+        if match:
+            entry.model = match.group("model")
+            entry.design = match.group("design")
+        else:
+            entry.model = parts[-1]
+    entry.width, entry.height = _read_dimensions(path)
+    return entry
+
+
+class AssetCatalog:
+    """Index of design, material and import images persisted as JSON.
+
+    ``refresh`` walks the roots with ``os.scandir`` and only re-reads image
+    headers for files whose mtime or size changed since the index was written.
+    """
+
+    def __init__(self, index_path: str = CATALOG_PATH, roots: Optional[Dict[str, str]] = None):
+        self.index_path = index_path
+        self.roots = dict(roots or ROOTS)
+        self.entries: Dict[str, CatalogEntry] = {}
+        self._by_name: Dict[Tuple[str, str], str] = {}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CATALOG_VERSION or data.get("roots") != self.roots:
+            return
+        self.entries = {path: CatalogEntry(**entry) for path, entry in data["entries"].items()}
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._by_name = {(e.kind, e.name): path for path, e in self.entries.items()}
+
+    def save(self) -> None:
+        data = {
+            "version": CATALOG_VERSION,
+            "roots": self.roots,
+            "entries": {path: asdict(entry) for path, entry in sorted(self.entries.items())},
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def refresh(self, kinds: Optional[List[str]] = None, save: bool = True) -> Dict[str, int]:
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        for kind in kinds or list(self.roots):
+            root_dir = self.roots[kind]
+            found = _scan(root_dir)
+            for path in [p for p, e in self.entries.items() if e.kind == kind and p not in found]:
+                del self.entries[path]
+                counts["removed"] += 1
+            for path, stat in found.items():
+                old = self.entries.get(path)
+                if old is not None and old.mtime_ns == stat.st_mtime_ns and old.file_size == stat.st_size:
+                    counts["unchanged"] += 1
+                    continue
+                self.entries[path] = _make_entry(kind, root_dir, path, stat)
+                counts["updated" if old is not None else "added"] += 1
+        self._reindex()
+        if save and (counts["added"] or counts["updated"] or counts["removed"]):
+            self.save()
+        return counts
+
+    def _of_kind(self, kind: str) -> List[CatalogEntry]:
+        return sorted((e for e in self.entries.values() if e.kind == kind), key=lambda e: e.name)
+
+    def manufacturers(self) -> Dict[str, List[str]]:
+        result: Dict[str, List[str]] = {}
+        for entry in self._of_kind("design"):
+            models = result.setdefault(entry.manufacturer, [])
+            if entry.model not in models:
+                models.append(entry.model)
+        return result
+
+    def designs(self, manufacturer: Optional[str] = None, model: Optional[str] = None) -> List[CatalogEntry]:
+        return [e for e in self._of_kind("design")
+                if (manufacturer is None or e.manufacturer == manufacturer) and (model is None or e.model == model)]
+
+    def names(self, kind: str) -> List[str]:
+        return [e.name for e in self._of_kind(kind)]
+
+    def resolve(self, kind: str, name: str) -> Optional[str]:
+        return self._by_name.get((kind, name))
+
+
+def load_catalog(index_path: str = CATALOG_PATH) -> AssetCatalog:
+    # The saved index brought up to date; builds it on first use, later only changed files are read
+    catalog = AssetCatalog(index_path)
+    catalog.refresh()
+    return catalog
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Refresh the asset catalog index")
+    parser.add_argument("-o", "--output", default=CATALOG_PATH)
+    args = parser.parse_args(argv)
+
+    catalog = AssetCatalog(args.output)
+    counts = catalog.refresh()
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import os
+from typing import Dict, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+
+import masks
+from asset_cache import AssetCache, default_cache
+from instrumentation import COMPOSITE, FIT, MASK, stats
+
+# Layer names, in stacking order
+DESIGN = "design"
+MATERIAL = "material"
+CUSTOM = "custom"
+CAMERA = "camera"
+
+# Render tiers: "draft" resamples a downscaled proxy of the custom image with a cheap
+# filter while the user is interacting, "full" is the LANCZOS pipeline
+TIER_DRAFT = "draft"
+TIER_FULL = "full"
+
+
+def _mtime(path: Optional[str]) -> int:
+    if path is None:
+        return 0
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class LayeredCompositor:
+    """Builds the case preview from cached layers and only redoes dirty ones.
+
+    The design and the material pasted under the design mask form a cached
+    base. The custom image is resampled only when it or its scale changes (one
+    resampled layer is kept per tier, so alternating draft and full frames do
+    not redo it), and a position change just re-blits that layer onto a copy of
+    the base.
+    """
+
+    def __init__(self, size: Tuple[int, int], cache: AssetCache = default_cache, resample: int = Image.LANCZOS,
+                 draft_resample: int = Image.BILINEAR, proxy_factor: int = 2):
+        self.size = tuple(size)
+        self.cache = cache
+        self.resample = resample
+        self.draft_resample = draft_resample
+        self.proxy_factor = proxy_factor
+        self.tier = TIER_FULL
+
+        self.design_path: Optional[str] = None
+        self.material_path: Optional[str] = None
+        # mtimes of the files as last built, so an asset edited on disk is picked up
+        self._design_mtime = 0
+        self._material_mtime = 0
+        self.camera_mask: Optional[Image.Image] = None
+        self.custom_img: Optional[Image.Image] = None
+        self.custom_img_scale: float = 1.0
+        self.custom_img_position: Tuple[int, int] = (0, 0)
+
+        self._design_image: Optional[Image.Image] = None
+        self._design_mask: Optional[Image.Image] = None
+        self._base: Optional[Image.Image] = None
+        self._custom_layer: Optional[Image.Image] = None
+        # tier -> (custom image, scale, resampled layer)
+        self._custom_layers: Dict[str, Tuple[Image.Image, float, Image.Image]] = {}
+        self._custom_proxy: Optional[Image.Image] = None
+        self._proxy_source: Optional[Image.Image] = None
+        self._frame: Optional[Image.Image] = None
+
+        self._dirty: Set[str] = {DESIGN, MATERIAL, CUSTOM, CAMERA}
+        self._position_dirty = True
+        # Layers rebuilt by the most recent render(), handy for checking what an edit cost
+        self.last_rebuilt: Tuple[str, ...] = ()
+
+    def set_design(self, path: Optional[str]) -> None:
+        mtime = _mtime(path)
+        if path != self.design_path or mtime != self._design_mtime:
+            self.design_path = path
+            self._design_mtime = mtime
+            self._dirty.add(DESIGN)
+
+    def set_material(self, path: Optional[str]) -> None:
+        mtime = _mtime(path)
+        if path != self.material_path or mtime != self._material_mtime:
+            self.material_path = path
+            self._material_mtime = mtime
+            self._dirty.add(MATERIAL)
+
+    def set_camera_mask(self, mask: Optional[Image.Image]) -> None:
+        if mask is not self.camera_mask:
+            self.camera_mask = mask
+            self._dirty.add(CAMERA)
+
+    def set_custom_image(self, image: Optional[Image.Image]) -> None:
+        if image is not self.custom_img:
+            self.custom_img = image
+            self._dirty.add(CUSTOM)
+
+    def set_scale(self, scale: float) -> None:
+        if scale != self.custom_img_scale:
+            self.custom_img_scale = scale
+            self._dirty.add(CUSTOM)
+
+    def set_tier(self, tier: str) -> None:
+        if tier not in (TIER_DRAFT, TIER_FULL):
+            raise ValueError(f"Unknown render tier: {tier}")
+        if tier != self.tier:
+            self.tier = tier
+            self._dirty.add(CUSTOM)
+
+    def set_position(self, position: Tuple[int, int]) -> None:
+        position = tuple(position)
+        if position != self.custom_img_position:
+            self.custom_img_position = position
+            self._position_dirty = True
+
+    def invalidate(self) -> None:
+        # Force every layer to be rebuilt, e.g. after asset files changed on disk
+        self._dirty.update((DESIGN, MATERIAL, CUSTOM, CAMERA))
+        self._custom_layers.clear()
+
+    def render(self) -> Image.Image:
+        rebuilt = []
+        if DESIGN in self._dirty:
+            self._build_design()
+            rebuilt.append(DESIGN)
+        # The material sits under the design mask, so a new design or cutout re-pastes it too
+        if self._dirty & {DESIGN, MATERIAL, CAMERA} or self._base is None:
+            self._build_base()
+            rebuilt.append(MATERIAL)
+        layer = self._custom_layer
+        if CUSTOM in self._dirty and self._build_custom():
+            rebuilt.append(CUSTOM)
+
+        if rebuilt or self._custom_layer is not layer or self._position_dirty or self._frame is None:
+            self._frame = self._blit()
+        self._dirty.clear()
+        self._position_dirty = False
+        self.last_rebuilt = tuple(rebuilt)
+        return self._frame
+
+    def _build_design(self) -> None:
+        if self.design_path is None:
+            self._design_image = None
+            self._design_mask = None
+            return
+        self._design_image = self.cache.get(self.design_path, self.size, self.resample)
+        # Dark areas of the design are where material and custom image show through
+        with stats.stage(MASK):
+            self._design_mask = masks.cached_dark_mask(self.cache, self.design_path, self.size, self.resample)
+
+    def _build_base(self) -> None:
+        material_image = None
+        mask = self._design_mask
+        if self.material_path is not None:
+            material_image = self.cache.get(self.material_path, self.size, self.resample)
+            if self.camera_mask is not None:
+                if mask is None:
+                    mask = self.camera_mask
+                else:
+                    with stats.stage(MASK):
+                        mask = masks.to_image(masks.combine(masks.to_array(mask), masks.to_array(self.camera_mask)))
+        with stats.stage(COMPOSITE):
+            base = Image.new('RGBA', self.size, (255, 255, 255, 0))
+            if self._design_image is not None:
+                base = Image.alpha_composite(base, self._design_image)
+            if material_image is not None:
+                base.paste(material_image, (0, 0), mask)
+        self._base = base
+
+    def _build_custom(self) -> bool:
+        # Returns whether the custom image had to be resampled
+        if self.custom_img is None:
+            self._custom_layer = None
+            return False
+        cached = self._custom_layers.get(self.tier)
+        if cached is not None and cached[0] is self.custom_img and cached[1] == self.custom_img_scale:
+            self._custom_layer = cached[2]
+            return False
+        scaled_size = (max(1, int(self.custom_img.width * self.custom_img_scale)),
+                       max(1, int(self.custom_img.height * self.custom_img_scale)))
+        if self.tier == TIER_DRAFT:
+            source, resample = self._proxy(), self.draft_resample
+        else:
+            source, resample = self.custom_img, self.resample
+        with stats.stage(FIT):
+            custom_img_resized = source.resize(scaled_size, resample).convert("RGBA")
+            self._custom_layer = ImageOps.fit(custom_img_resized, self.size, resample)
+        self._custom_layers[self.tier] = (self.custom_img, self.custom_img_scale, self._custom_layer)
+        return True
+
+    def _proxy(self) -> Image.Image:
+        # Downscaled copy of the custom image, made once per image and reused for every draft frame
+        if self._proxy_source is not self.custom_img:
+            self._custom_proxy = self.custom_img.reduce(self.proxy_factor) if self.proxy_factor > 1 else self.custom_img
+            self._proxy_source = self.custom_img
+        return self._custom_proxy
+
+    def _blit(self) -> Image.Image:
+        if self._custom_layer is None:
+            return self._base
+        with stats.stage(COMPOSITE):
+            frame = self._base.copy()
+            frame.paste(self._custom_layer, self.custom_img_position, self._design_mask)
+        return frame
@@ -28,29 +28,48 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    designSelect.addEventListener('change', function() {
-        const design = designSelect.value;
-        if (design !== 'None' && design !== '') {
-            const img = new Image();
-            img.src = '/images/' + design + '.jpg';
-            img.onload = function() {
-                ctx.drawImage(img, 0, 0, previewCanvas.width, previewCanvas.height);
-            };
-        } else {
-            ctx.clearRect(0, 0, previewCanvas.width, previewCanvas.height);
-        }
-    });
+    // Finished previews come from render_server.py, which masks the material under the
+    // design and sizes the result to the canvas; identical selections are served from its cache
+    const renderService = window.RENDER_SERVICE_URL || 'http://127.0.0.1:8765';
+    let latestRequest = 0;
 
-    materialSelect.addEventListener('change', function() {
-        const material = materialSelect.value;
-        if (material !== 'None' && material !== '') {
-            const img = new Image();
-            img.src = '/images/' + material + '.jpg';
-            img.onload = function() {
-                ctx.drawImage(img, 0, 0, previewCanvas.width, previewCanvas.height);
-            };
-        } else {
+    function refreshPreview() {
+        const params = new URLSearchParams({
+            manufacturer: manufacturerSelect.value,
+            model: modelSelect.value,
+            design: designSelect.value,
+            material: materialSelect.value,
+            w: previewCanvas.width,
+            h: previewCanvas.height,
+        });
+        // Only the newest request may draw; clearing counts too, so a late response cannot
+        // paint over a canvas that was just emptied
+        const request = ++latestRequest;
+        if ((!designSelect.value || designSelect.value === 'None') && (!materialSelect.value || materialSelect.value === 'None')) {
             ctx.clearRect(0, 0, previewCanvas.width, previewCanvas.height);
+            return;
         }
-    });
+        const img = new Image();
+        img.crossOrigin = 'anonymous';
+        img.onload = function() {
+            if (request !== latestRequest) {
+                return;
+            }
+            ctx.clearRect(0, 0, previewCanvas.width, previewCanvas.height);
+            ctx.drawImage(img, 0, 0, previewCanvas.width, previewCanvas.height);
+        };
+        img.onerror = function() {
+            if (request !== latestRequest) {
+                return;
+            }
+            // Unknown asset or service not running: show nothing rather than the previous selection
+            ctx.clearRect(0, 0, previewCanvas.width, previewCanvas.height);
+            console.error('Preview could not be rendered: ' + img.src);
+        };
+        img.src = renderService + '/render?' + params.toString();
+    }
+
+    modelSelect.addEventListener('change', refreshPreview);
+    designSelect.addEventListener('change', refreshPreview);
+    materialSelect.addEventListener('change', refreshPreview);
 });
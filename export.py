@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+from typing import Any, BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+import masks
+from import_store import open_reduced
+from instrumentation import EXPORT_ENCODE, stats
+from render import CaseRenderer, RenderSpec
+
+PRINT_DPI = 300
+# Physical size of the printable case back in millimetres (width, height)
+CASE_SIZE_MM: Tuple[float, float] = (75.0, 150.0)
+TILE_SIZE = 512
+
+Box = Tuple[float, float, float, float]
+Rect = Tuple[int, int, int, int]
+
+
+def print_size(size_mm: Tuple[float, float] = CASE_SIZE_MM, dpi: int = PRINT_DPI) -> Tuple[int, int]:
+    return round(size_mm[0] / 25.4 * dpi), round(size_mm[1] / 25.4 * dpi)
+
+
+def fit_box(source_size: Tuple[int, int], target_size: Tuple[int, int]) -> Box:
+    # The centered crop ImageOps.fit takes from the source before resizing
+    width, height = source_size
+    output_ratio = target_size[0] / target_size[1]
+    if width / height >= output_ratio:
+        crop_width, crop_height = output_ratio * height, height
+    else:
+        crop_width, crop_height = width, width / output_ratio
+    left, top = (width - crop_width) * 0.5, (height - crop_height) * 0.5
+    return left, top, left + crop_width, top + crop_height
+
+
+class _FittedSource:
+    """A source image plus the crop that maps it onto the full output canvas."""
+
+    def __init__(self, path: str, target_size: Tuple[int, int], resample: int, pyramids: Any = None):
+        # A pyramid level at least as large as the output is mapped instead of decoding the file.
+        # Otherwise JPEGs decode at the smallest DCT scale that still covers both output sides,
+        # which the centered crop needs as well
+        image = pyramids.source(path, target_size) if pyramids is not None else None
+        self.image = image if image is not None else open_reduced(path, target_size).convert("RGBA")
+        self.box = fit_box(self.image.size, target_size)
+        self.target_size = target_size
+        self.resample = resample
+
+    def region(self, rect: Rect) -> Image.Image:
+        # Resample only the part of the source under ``rect``; neighbouring source pixels
+        # still feed the filter, so adjacent tiles join without seams
+        x0, y0, x1, y1 = rect
+        bx0, by0, bx1, by1 = self.box
+        sx = (bx1 - bx0) / self.target_size[0]
+        sy = (by1 - by0) / self.target_size[1]
+        box = (bx0 + x0 * sx, by0 + y0 * sy, bx0 + x1 * sx, by0 + y1 * sy)
+        if sx == sy == 1:
+            # A pyramid level built for this output size: cut the tile out instead of resampling
+            return self.image.crop(tuple(round(v) for v in box))
+        return self.image.resize((x1 - x0, y1 - y0), self.resample, box=box)
+
+
+class TiledRenderer:
+    """Re-renders a composition at an arbitrary resolution one tile at a time.
+
+    Positions in the spec are in preview pixels (``spec.size``) and are scaled
+    to the output. The custom image is sampled from its full-size original.
+    """
+
+    def __init__(self, spec: RenderSpec, size: Tuple[int, int], resolve: Optional[Callable[[str, Optional[str]], Optional[str]]] = None,
+                 custom_path: Optional[str] = None, resample: int = Image.LANCZOS, pyramids: Any = None):
+        resolve = resolve or CaseRenderer().resolve
+        self.size = tuple(size)
+        design_path = resolve("design", spec.design)
+        material_path = resolve("material", spec.material)
+        custom_path = custom_path or spec.custom_image
+        self.design = _FittedSource(design_path, self.size, resample) if design_path else None
+        self.material = _FittedSource(material_path, self.size, resample, pyramids) if material_path else None
+        # The preview resizes by the zoom factor and then fits to the canvas, which cancels the zoom;
+        # fitting the original directly gives the same framing at full resolution
+        self.custom = _FittedSource(custom_path, self.size, resample) if custom_path else None
+        self.offset = (round(spec.position[0] * self.size[0] / spec.size[0]),
+                       round(spec.position[1] * self.size[1] / spec.size[1]))
+
+    def _design_mask(self, rect: Rect) -> Optional[Image.Image]:
+        if self.design is None:
+            return None
+        return masks.dark_mask(self.design.region(rect))
+
+    def render_tile(self, rect: Rect) -> Image.Image:
+        x0, y0, x1, y1 = rect
+        tile = Image.new('RGBA', (x1 - x0, y1 - y0), (255, 255, 255, 0))
+        mask = None
+        if self.design is not None:
+            # Resampled once; the material mask is derived from the same region
+            design = self.design.region(rect)
+            tile = Image.alpha_composite(tile, design)
+            mask = masks.dark_mask(design)
+        if self.material is not None:
+            tile.paste(self.material.region(rect), (0, 0), mask)
+        if self.custom is not None:
+            # paste() moves the design mask together with the custom layer, so both are
+            # sampled from the layer rectangle that lands on this tile
+            dx, dy = self.offset
+            layer = (max(0, x0 - dx), max(0, y0 - dy), min(self.size[0], x1 - dx), min(self.size[1], y1 - dy))
+            if layer[0] < layer[2] and layer[1] < layer[3]:
+                layer_mask = mask if layer == rect else self._design_mask(layer)
+                tile.paste(self.custom.region(layer), (layer[0] + dx - x0, layer[1] + dy - y0), layer_mask)
+        return tile
+
+    def bands(self, tile_size: int = TILE_SIZE, mode: str = "RGBA") -> Iterator[Image.Image]:
+        # Full-width strips, tile_size rows high, each assembled from tile_size x tile_size tiles
+        width, height = self.size
+        for y0 in range(0, height, tile_size):
+            y1 = min(height, y0 + tile_size)
+            band = Image.new(mode, (width, y1 - y0))
+            for x0 in range(0, width, tile_size):
+                x1 = min(width, x0 + tile_size)
+                tile = self.render_tile((x0, y0, x1, y1))
+                band.paste(tile.convert(mode) if mode != "RGBA" else tile, (x0, 0))
+            yield band
+
+
+def _png_chunk(out: BinaryIO, kind: bytes, data: bytes) -> None:
+    out.write(struct.pack(">I", len(data)) + kind + data)
+    out.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def write_png(out: BinaryIO, size: Tuple[int, int], bands: Iterator[Image.Image], mode: str, dpi: int,
+              compress_level: int = 6) -> None:
+    color_type = {"RGBA": 6, "RGB": 2}[mode]
+    out.write(b"\x89PNG\r\n\x1a\n")
+    _png_chunk(out, b"IHDR", struct.pack(">IIBBBBB", size[0], size[1], 8, color_type, 0, 0, 0))
+    pixels_per_metre = round(dpi / 0.0254)
+    _png_chunk(out, b"pHYs", struct.pack(">IIB", pixels_per_metre, pixels_per_metre, 1))
+    compressor = zlib.compressobj(compress_level)
+    stride = size[0] * len(mode)
+    for band in bands:
+        with stats.stage(EXPORT_ENCODE):
+            raw = band.tobytes()
+            # Filter type 0 (None) in front of every scanline
+            rows = b"".join(b"\x00" + raw[i:i + stride] for i in range(0, len(raw), stride))
+            data = compressor.compress(rows)
+            if data:
+                _png_chunk(out, b"IDAT", data)
+    with stats.stage(EXPORT_ENCODE):
+        _png_chunk(out, b"IDAT", compressor.flush())
+    _png_chunk(out, b"IEND", b"")
+
+
+def write_tiff(out: BinaryIO, size: Tuple[int, int], bands: Iterator[Image.Image], mode: str, dpi: int,
+               rows_per_strip: int) -> None:
+    # Baseline uncompressed little-endian TIFF; strip sizes are known up front, so the
+    # header and IFD go first and the strips are streamed after them
+    width, height = size
+    samples = len(mode)
+    strip_count = (height + rows_per_strip - 1) // rows_per_strip
+    strip_sizes = [width * samples * min(rows_per_strip, height - i * rows_per_strip) for i in range(strip_count)]
+
+    entries = 12 + (1 if samples == 4 else 0)
+    ifd_offset = 8
+    ifd_size = 2 + entries * 12 + 4
+    extra = ifd_offset + ifd_size
+    bits_offset = extra
+    offsets_offset = bits_offset + 2 * samples
+    counts_offset = offsets_offset + 4 * strip_count
+    xres_offset = counts_offset + 4 * strip_count
+    yres_offset = xres_offset + 8
+    data_offset = yres_offset + 8
+
+    strip_offsets = []
+    position = data_offset
+    for strip_size in strip_sizes:
+        strip_offsets.append(position)
+        position += strip_size
+
+    def entry(tag: int, kind: int, count: int, value: int) -> bytes:
+        if kind == 3 and count == 1:
+            return struct.pack("<HHIHH", tag, kind, count, value, 0)
+        return struct.pack("<HHII", tag, kind, count, value)
+
+    tags = [
+        entry(256, 4, 1, width),
+        entry(257, 4, 1, height),
+        entry(258, 3, samples, bits_offset),
+        entry(259, 3, 1, 1),
+        entry(262, 3, 1, 2),
+        entry(273, 4, strip_count, offsets_offset if strip_count > 1 else strip_offsets[0]),
+        entry(277, 3, 1, samples),
+        entry(278, 4, 1, rows_per_strip),
+        entry(279, 4, strip_count, counts_offset if strip_count > 1 else strip_sizes[0]),
+        entry(282, 5, 1, xres_offset),
+        entry(283, 5, 1, yres_offset),
+        entry(296, 3, 1, 2),
+    ]
+    if samples == 4:
+        tags.append(entry(338, 3, 1, 2))  # ExtraSamples: unassociated alpha
+    out.write(b"II*\x00" + struct.pack("<I", ifd_offset))
+    out.write(struct.pack("<H", len(tags)) + b"".join(tags) + struct.pack("<I", 0))
+    out.write(struct.pack(f"<{samples}H", *([8] * samples)))
+    out.write(struct.pack(f"<{strip_count}I", *strip_offsets))
+    out.write(struct.pack(f"<{strip_count}I", *strip_sizes))
+    out.write(struct.pack("<II", dpi, 1) * 2)
+    for band in bands:
+        with stats.stage(EXPORT_ENCODE):
+            out.write(band.tobytes())
+
+
+def export_print(spec: RenderSpec, path: str, size: Optional[Tuple[int, int]] = None, dpi: int = PRINT_DPI,
+                 fmt: Optional[str] = None, tile_size: int = TILE_SIZE, custom_path: Optional[str] = None,
+                 resolve: Optional[Callable[[str, Optional[str]], Optional[str]]] = None,
+                 pyramids: Any = None) -> Tuple[int, int]:
+    size = tuple(size or print_size(dpi=dpi))
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).upper()
+    fmt = {"JPG": "JPEG", "TIF": "TIFF"}.get(fmt, fmt)
+    renderer = TiledRenderer(spec, size, resolve, custom_path, pyramids=pyramids)
+
+    tmp_path = path + ".tmp"
+    if fmt == "JPEG":
+        # PIL cannot encode JPEG incrementally, so strips go into one RGB canvas
+        # (3 bytes per pixel); every other buffer stays tile sized
+        canvas = Image.new("RGB", size)
+        for index, band in enumerate(renderer.bands(tile_size, "RGB")):
+            canvas.paste(band, (0, index * tile_size))
+        with stats.stage(EXPORT_ENCODE):
+            canvas.save(tmp_path, "JPEG", quality=95, dpi=(dpi, dpi))
+    elif fmt in ("PNG", "TIFF"):
+        with open(tmp_path, "wb") as out:
+            if fmt == "PNG":
+                write_png(out, size, renderer.bands(tile_size), "RGBA", dpi)
+            else:
+                write_tiff(out, size, renderer.bands(tile_size), "RGBA", dpi, tile_size)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    os.replace(tmp_path, path)
+    return size
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export a print-resolution case image from a render spec")
+    parser.add_argument("spec", help="JSON file with RenderSpec fields")
+    parser.add_argument("output", help="Output file (.png, .tif or .jpg; .jpg is built in memory, the others are streamed)")
+    parser.add_argument("--dpi", type=int, default=PRINT_DPI)
+    parser.add_argument("--mm", default="x".join(str(v) for v in CASE_SIZE_MM), help="Physical size in mm, e.g. 75x150")
+    parser.add_argument("--tile", type=int, default=TILE_SIZE)
+    args = parser.parse_args(argv)
+
+    with open(args.spec, encoding="utf-8") as f:
+        spec = RenderSpec.from_dict(json.load(f))
+    size_mm = tuple(float(v) for v in args.mm.split("x"))
+    size = export_print(spec, args.output, print_size(size_mm, args.dpi), args.dpi, tile_size=args.tile)
+    print(f"Exported {size[0]}x{size[1]} to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from catalog import CATALOG_PATH, AssetCatalog, load_catalog
+from export import CASE_SIZE_MM, PRINT_DPI, TiledRenderer, print_size, write_png, write_tiff
+from import_store import ImportStore, file_digest
+from material_pyramid import PyramidStore
+from order_store import ORDERS_PATH, OrderStore
+from render import CaseRenderer, RenderSpec, load_specs
+
+SHEET_SIZE_MM: Tuple[float, float] = (320.0, 450.0)  # SRA3
+GAP_MM = 3.0
+BAND_ROWS = 256
+# Sheets are large and short-lived; level 3 is about 3x faster than 6 for ~35% larger files
+SHEET_COMPRESS_LEVEL = 3
+COMPOSITIONS_DIR = "compositions"
+
+
+@dataclass
+class Composition:
+    key: str
+    spec: RenderSpec
+    custom_path: Optional[str]
+    quantity: int = 0
+    models: List[str] = field(default_factory=list)  # "<manufacturer> <model>" of the orders sharing it
+
+
+@dataclass
+class Placement:
+    key: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+def mm_to_px(mm: float, dpi: int) -> int:
+    return round(mm / 25.4 * dpi)
+
+
+class Deduplicator:
+    """Collapses order lines into distinct case compositions.
+
+    The key hashes design, material, the custom image's content hash, position,
+    scale and the preview size the transform refers to, plus the mtimes of the
+    design and material files so edited assets re-render. Manufacturer and
+    model are left out: print renders apply no camera cutouts, so the same
+    design ordered for two models gives the same pixels.
+    """
+
+    def __init__(self, resolve: Any, imports: ImportStore):
+        self.resolve = resolve
+        self.imports = imports
+        self.compositions: Dict[str, Composition] = {}
+        self._digests: Dict[str, str] = {}
+
+    def _custom(self, value: Optional[str]) -> Tuple[Optional[str], str]:
+        # Import digests (as stored on order lines) or plain file paths (as in spec files)
+        if not value:
+            return None, ""
+        record = self.imports.get(value)
+        if record is not None:
+            return self.imports.original_path(record), record.digest
+        if value not in self._digests:
+            self._digests[value] = file_digest(value)
+        return value, self._digests[value]
+
+    def _stamp(self, kind: str, name: Optional[str]) -> Tuple[Optional[str], int]:
+        path = self.resolve(kind, name)
+        if path is None:
+            return None, 0
+        if not os.path.isfile(path):
+            raise ValueError(f"Unknown {kind}: {name}")
+        return path, os.stat(path).st_mtime_ns
+
+    def add(self, spec: RenderSpec, quantity: int = 1) -> Composition:
+        custom_path, custom_digest = self._custom(spec.custom_image)
+        # Position and scale only matter when there is a custom image to place
+        transform = [list(spec.position), spec.scale, list(spec.size)] if custom_digest else []
+        key_data = [self._stamp("design", spec.design), self._stamp("material", spec.material), custom_digest, transform]
+        key = hashlib.sha256(json.dumps(key_data).encode()).hexdigest()[:32]
+        composition = self.compositions.get(key)
+        if composition is None:
+            composition = self.compositions[key] = Composition(key, spec, custom_path)
+        composition.quantity += quantity
+        model = f"{spec.manufacturer} {spec.model}".strip()
+        if model and model not in composition.models:
+            composition.models.append(model)
+        return composition
+
+
+def pack(items: List[Tuple[str, int, int, int]], sheet_size: Tuple[int, int], gap: int) -> List[List[Placement]]:
+    # First-fit decreasing-height shelf packing across as many sheets as needed. Items are
+    # (key, width, height, count); they keep their orientation (print direction) and the copies
+    # of one composition are laid down a shelf at a time, so they stay together and a sheet
+    # usually needs only a few distinct compositions
+    sheets: List[List[Placement]] = []
+    shelves: List[List[List[int]]] = []  # per sheet: [y, height, next x]
+    open_sheets: List[int] = []
+    sheet_width, sheet_height = sheet_size
+    min_width = min((width for _, width, _, _ in items), default=0)
+    min_height = min((height for _, _, height, _ in items), default=0)
+
+    def fill_shelf(sheet: List[Placement], shelf: List[int], key: str, width: int, height: int, count: int) -> int:
+        # Places as many of ``count`` copies as fit on the shelf and returns how many are left
+        placed = min(count, (sheet_width - shelf[2]) // (width + gap))
+        sheet.extend(Placement(key, shelf[2] + i * (width + gap), shelf[0], width, height) for i in range(placed))
+        shelf[2] += placed * (width + gap)
+        return count - placed
+
+    def fill(index: int, key: str, width: int, height: int, count: int) -> int:
+        sheet, sheet_shelves = sheets[index], shelves[index]
+        for shelf in sheet_shelves:
+            if count and height <= shelf[1]:
+                count = fill_shelf(sheet, shelf, key, width, height, count)
+        while count:
+            top = sheet_shelves[-1][0] + sheet_shelves[-1][1] + gap if sheet_shelves else gap
+            if top + height + gap > sheet_height:
+                break
+            sheet_shelves.append([top, height, gap])
+            count = fill_shelf(sheet, sheet_shelves[-1], key, width, height, count)
+        return count
+
+    def full(index: int) -> bool:
+        # Later items are never taller than any shelf, so only widths and the room for one more
+        # shelf matter
+        sheet_shelves = shelves[index]
+        top = sheet_shelves[-1][0] + sheet_shelves[-1][1] + gap
+        return (top + min_height + gap > sheet_height
+                and all(shelf[2] + min_width + gap > sheet_width for shelf in sheet_shelves))
+
+    for key, width, height, count in sorted(items, key=lambda item: (-item[2], -item[1], item[0])):
+        if width + 2 * gap > sheet_width or height + 2 * gap > sheet_height:
+            raise ValueError(f"A {width}x{height} case does not fit on a {sheet_width}x{sheet_height} sheet")
+        for index in open_sheets:
+            count = fill(index, key, width, height, count)
+            if not count:
+                break
+        while count:
+            sheets.append([])
+            shelves.append([])
+            open_sheets.append(len(sheets) - 1)
+            count = fill(len(sheets) - 1, key, width, height, count)
+        # Full sheets are never looked at again, so the scan stays short however large the batch
+        open_sheets = [index for index in open_sheets if not full(index)]
+    return sheets
+
+
+_resolve: Any = None
+_pyramids: Optional[PyramidStore] = None
+
+
+def _init_worker(catalog_path: str) -> None:
+    global _resolve, _pyramids
+    _resolve = CaseRenderer(catalog=AssetCatalog(catalog_path)).resolve
+    _pyramids = PyramidStore()
+
+
+def _render_composition(job: Tuple[str, Dict[str, Any], Optional[str], Tuple[int, int], str]) -> Tuple[str, Optional[str]]:
+    # Runs in a worker process; a composition already on disk from an earlier run is kept
+    key, data, custom_path, size, path = job
+    if os.path.exists(path):
+        return key, None
+    try:
+        renderer = TiledRenderer(RenderSpec.from_dict(data), size, _resolve, custom_path, pyramids=_pyramids)
+        image = renderer.render_tile((0, 0, size[0], size[1]))
+        image.save(path + ".tmp", "PNG", compress_level=1)
+        os.replace(path + ".tmp", path)
+        return key, None
+    except Exception as e:
+        return key, f"{type(e).__name__}: {e}"
+
+
+def sheet_bands(size: Tuple[int, int], placements: List[Placement], paths: Dict[str, str],
+                band_rows: int = BAND_ROWS) -> Iterator[Image.Image]:
+    # Each distinct composition on the sheet is decoded once; the sheet itself only ever
+    # exists as one band of rows at a time
+    images: Dict[str, Image.Image] = {}
+    for placement in placements:
+        if placement.key not in images:
+            images[placement.key] = Image.open(paths[placement.key]).convert("RGBA")
+    width, height = size
+    for y0 in range(0, height, band_rows):
+        y1 = min(height, y0 + band_rows)
+        band = Image.new("RGBA", (width, y1 - y0), (255, 255, 255, 0))
+        for p in placements:
+            top, bottom = max(y0, p.y), min(y1, p.y + p.height)
+            if top < bottom:
+                band.paste(images[p.key].crop((0, top - p.y, p.width, bottom - p.y)), (p.x, top - y0))
+        yield band
+
+
+def _write_sheet(job: Tuple[str, Tuple[int, int], List[Placement], Dict[str, str], int, str]) -> str:
+    path, size, placements, paths, dpi, fmt = job
+    with open(path + ".tmp", "wb") as out:
+        if fmt == "TIFF":
+            write_tiff(out, size, sheet_bands(size, placements, paths), "RGBA", dpi, BAND_ROWS)
+        else:
+            write_png(out, size, sheet_bands(size, placements, paths), "RGBA", dpi, SHEET_COMPRESS_LEVEL)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def produce(orders: Iterable[Tuple[RenderSpec, int]], out_dir: str, dpi: int = PRINT_DPI,
+            sheet_mm: Tuple[float, float] = SHEET_SIZE_MM, gap_mm: float = GAP_MM, fmt: str = "PNG",
+            workers: Optional[int] = None, catalog_path: str = CATALOG_PATH,
+            imports: Optional[ImportStore] = None) -> Dict[str, Any]:
+    fmt = {"TIF": "TIFF"}.get(fmt.upper(), fmt.upper())
+    if fmt not in ("PNG", "TIFF"):
+        raise ValueError(f"Unsupported sheet format: {fmt}")
+    resolve = CaseRenderer(catalog=load_catalog(catalog_path)).resolve
+    dedup = Deduplicator(resolve, imports or ImportStore())
+    for spec, quantity in orders:
+        dedup.add(spec, quantity)
+
+    case_size = print_size(CASE_SIZE_MM, dpi)
+    compositions_dir = os.path.join(out_dir, COMPOSITIONS_DIR)
+    os.makedirs(compositions_dir, exist_ok=True)
+    paths = {key: os.path.join(compositions_dir, f"{key}_{dpi}dpi.png") for key in dedup.compositions}
+    render_jobs = [(c.key, c.spec.to_dict(), c.custom_path, case_size, paths[c.key])
+                   for c in dedup.compositions.values()]
+    cached = sum(os.path.exists(paths[key]) for key in paths)
+
+    items = [(c.key,) + case_size + (c.quantity,) for c in dedup.compositions.values()]
+    sheet_size = (mm_to_px(sheet_mm[0], dpi), mm_to_px(sheet_mm[1], dpi))
+    sheets = pack(items, sheet_size, mm_to_px(gap_mm, dpi))
+    ext = ".tif" if fmt == "TIFF" else ".png"
+    sheet_jobs = [(os.path.join(out_dir, f"sheet_{index + 1:04d}{ext}"), sheet_size, placements,
+                   {p.key: paths[p.key] for p in placements}, dpi, fmt) for index, placements in enumerate(sheets)]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(catalog_path,)) as pool:
+        errors = {key: error for key, error in pool.map(_render_composition, render_jobs) if error}
+        if errors:
+            return {"errors": errors}
+        written = list(pool.map(_write_sheet, sheet_jobs))
+
+    manifest = {
+        "dpi": dpi,
+        "sheet_px": sheet_size,
+        "case_px": case_size,
+        "cases": sum(c.quantity for c in dedup.compositions.values()),
+        "compositions": len(dedup.compositions),
+        "rendered": len(dedup.compositions) - cached,
+        "sheets": [{"file": os.path.basename(path), "placements": [[p.key, p.x, p.y] for p in placements]}
+                   for path, placements in zip(written, sheets)],
+        "keys": {c.key: dict(c.spec.to_dict(), manufacturer=None, model=None, models=c.models, quantity=c.quantity)
+                 for c in dedup.compositions.values()},
+    }
+    with open(os.path.join(out_dir, "sheets.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def orders_from_store(path: str = ORDERS_PATH) -> Iterator[Tuple[RenderSpec, int]]:
+    with OrderStore(path) as store:
+        for line in store.lines():
+            yield RenderSpec(manufacturer=line.manufacturer, model=line.model, design=line.design,
+                             material=line.material, custom_image=line.custom_image or None,
+                             position=(line.position_x, line.position_y), scale=line.scale), line.quantity
+
+
+def orders_from_file(path: str) -> Iterator[Tuple[RenderSpec, int]]:
+    for data in load_specs(path):
+        yield RenderSpec.from_dict(data), int(data.get("quantity") or 1)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Impose a batch of orders onto print sheets, rendering each distinct case once")
+    parser.add_argument("orders", nargs="?", help="JSON or CSV file with RenderSpec fields and a quantity (default: the order store)")
+    parser.add_argument("--db", default=ORDERS_PATH, help="Order store used when no orders file is given")
+    parser.add_argument("-o", "--out-dir", default="sheets")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--dpi", type=int, default=PRINT_DPI)
+    parser.add_argument("--sheet-mm", default="x".join(f"{v:g}" for v in SHEET_SIZE_MM), help="Sheet size in mm, e.g. 320x450")
+    parser.add_argument("--gap-mm", type=float, default=GAP_MM, help="Space between cases and around the sheet edge")
+    parser.add_argument("--format", default="png", choices=("png", "tif"))
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Asset catalog index used to resolve design and material names")
+    args = parser.parse_args(argv)
+
+    orders = orders_from_file(args.orders) if args.orders else orders_from_store(args.db)
+    sheet_mm = tuple(float(v) for v in args.sheet_mm.split("x"))
+    try:
+        result = produce(orders, args.out_dir, args.dpi, sheet_mm, args.gap_mm, args.format, args.workers, args.catalog)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for key, error in result.get("errors", {}).items():
+        print(f"Composition {key}: {error}", file=sys.stderr)
+    if "errors" in result:
+        return 1
+    print(f"{result['cases']} case(s) from {result['compositions']} distinct composition(s) "
+          f"({result['rendered']} rendered) on {len(result['sheets'])} sheet(s) in {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
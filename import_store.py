@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from catalog import IMAGE_EXTENSIONS
+
+IMPORTS_DIR = "imports"
+PROXY_SIZE: Tuple[int, int] = (270, 540)
+
+logger = logging.getLogger("catchycases.imports")
+
+
+@dataclass
+class ImportRecord:
+    digest: str
+    name: str
+    ext: str
+    file_size: int
+    width: int
+    height: int
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def open_reduced(path: str, size: Tuple[int, int]) -> Image.Image:
+    # JPEGs are decoded at 1/2, 1/4 or 1/8 scale straight from the DCT when that still
+    # covers the target size, so a 40 MP photo never has to be fully decoded
+    image = Image.open(path)
+    if image.format == "JPEG":
+        image.draft("RGB", size)
+    return image
+
+
+def make_proxy(path: str, size: Tuple[int, int] = PROXY_SIZE) -> Image.Image:
+    # Same result the app used to compute on every selection: RGBA, thumbnailed to the preview canvas
+    image = open_reduced(path, size).convert("RGBA")
+    image.thumbnail(size, Image.LANCZOS)
+    return image
+
+
+class ImportStore:
+    """Customer uploads stored by SHA-256 of their content.
+
+    ``imports/originals/<digest><ext>`` holds each distinct file once and
+    ``imports/proxies/<digest>_<W>x<H>.png`` the RGBA working copy shown in the preview.
+    ``imports/index.json`` maps digests to the original file names.
+    """
+
+    def __init__(self, root: str = IMPORTS_DIR, proxy_size: Tuple[int, int] = PROXY_SIZE):
+        self.root = root
+        self.proxy_size = tuple(proxy_size)
+        self.index_path = os.path.join(root, "index.json")
+        self.records: Dict[str, ImportRecord] = {}
+        self._index_mtime: Optional[int] = None  # of the index as last loaded or saved
+        self._lock = threading.Lock()
+        self.load()
+
+    def original_path(self, record: ImportRecord) -> str:
+        return os.path.join(self.root, "originals", record.digest + record.ext)
+
+    def proxy_path(self, record: ImportRecord) -> str:
+        return os.path.join(self.root, "proxies", f"{record.digest}_{self.proxy_size[0]}x{self.proxy_size[1]}.png")
+
+    def load(self) -> None:
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        records = {digest: ImportRecord(**entry) for digest, entry in data.get("entries", {}).items()}
+        with self._lock:
+            self.records = records
+            self._index_mtime = mtime
+
+    def reload_if_changed(self) -> bool:
+        # Another process (the desktop app) may have imported files since the index was loaded
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._index_mtime:
+            return False
+        self.load()
+        return True
+
+    def save(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": {d: asdict(r) for d, r in self.records.items()}}, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime = os.stat(self.index_path).st_mtime_ns
+
+    def add(self, filepath: str) -> Tuple[ImportRecord, bool]:
+        # Returns the record and whether the content was new
+        digest = file_digest(filepath)
+        with self._lock:
+            record = self.records.get(digest)
+            if record is not None:
+                return record, False
+
+            ext = os.path.splitext(filepath)[1].lower()
+            record = ImportRecord(digest=digest, name=self._unique_name(os.path.basename(filepath), digest),
+                                  ext=ext, file_size=os.path.getsize(filepath), width=0, height=0)
+            os.makedirs(os.path.join(self.root, "originals"), exist_ok=True)
+            original = self.original_path(record)
+            shutil.copyfile(filepath, original + ".tmp")
+            os.replace(original + ".tmp", original)
+            try:
+                with Image.open(original) as image:
+                    record.width, record.height = image.size
+                self._write_proxy(record)
+            except OSError:
+                # Not an image Pillow can read; leave no orphaned copy behind
+                os.remove(original)
+                raise
+            self.records[digest] = record
+            self.save()
+            return record, True
+
+    def _unique_name(self, name: str, digest: str) -> str:
+        # Different files uploaded under the same name get the digest prefix appended
+        if all(r.name != name for r in self.records.values()):
+            return name
+        stem, ext = os.path.splitext(name)
+        return f"{stem} [{digest[:8]}]{ext}"
+
+    def _write_proxy(self, record: ImportRecord) -> Image.Image:
+        proxy = make_proxy(self.original_path(record), self.proxy_size)
+        path = self.proxy_path(record)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        proxy.save(path + ".tmp", "PNG", compress_level=1)
+        os.replace(path + ".tmp", path)
+        return proxy
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(record.name for record in self.records.values())
+
+    def get(self, digest: str) -> Optional[ImportRecord]:
+        with self._lock:
+            return self.records.get(digest)
+
+    def find(self, name: str) -> Optional[ImportRecord]:
+        with self._lock:
+            for record in self.records.values():
+                if record.name == name:
+                    return record
+        return None
+
+    def load_proxy(self, record: ImportRecord) -> Image.Image:
+        # Decoding the small PNG proxy instead of the full-size original
+        try:
+            with Image.open(self.proxy_path(record)) as image:
+                return image.convert("RGBA")
+        except OSError:
+            return self._write_proxy(record)
+
+    def adopt_loose_files(self) -> int:
+        # Move files copied into imports/ by older versions into the content-addressed layout
+        adopted = 0
+        if not os.path.isdir(self.root):
+            return adopted
+        with os.scandir(self.root) as it:
+            loose = [e.path for e in it if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS)]
+        for path in loose:
+            try:
+                _, new = self.add(path)
+            except OSError as e:
+                # An unreadable file stays where it is and does not stop the others
+                logger.warning("Skipping import %s: %s", path, e)
+                continue
+            os.remove(path)
+            adopted += new
+        return adopted
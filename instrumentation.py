@@ -0,0 +1,239 @@
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from typing import Any, ContextManager, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("catchycases.render")
+startup_logger = logging.getLogger("catchycases.startup")
+
+# Stage names used across the render pipeline
+ASSET_OPEN = "asset_open"
+FIT = "fit"
+MASK = "mask"
+COMPOSITE = "composite"
+CAMERA_MASK = "camera_mask"
+PHOTOIMAGE = "photoimage"
+EXPORT_ENCODE = "export_encode"
+
+_NULL_STAGE = nullcontext()
+_MODULE_START = time.perf_counter()
+
+
+def _ensure_handler(log: logging.Logger) -> None:
+    # Without any logging setup, INFO records are dropped by the last-resort handler;
+    # an application that configured logging keeps its own handlers and levels
+    if log.handlers or logging.getLogger().handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+
+class RenderError(Exception):
+    """A failed render with the stage it failed in and what triggered it."""
+
+    def __init__(self, cause: BaseException, trigger: str = "", spec: Optional[Dict[str, Any]] = None):
+        self.cause = cause
+        self.stage = getattr(cause, "render_stage", "unknown")
+        self.trigger = trigger
+        self.spec = spec or {}
+        super().__init__(f"{type(cause).__name__} in stage '{self.stage}' ({trigger or 'unknown trigger'}): {cause}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "time": time.time(),
+            "stage": self.stage,
+            "trigger": self.trigger,
+            "error": type(self.cause).__name__,
+            "message": str(self.cause),
+            "spec": self.spec,
+        }
+
+
+class _StageTimer:
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats: "RenderStats", name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stats.record(self.name, time.perf_counter() - self.start)
+        if exc is not None and not hasattr(exc, "render_stage"):
+            # Innermost stage wins, so RenderError can say where things broke
+            exc.render_stage = self.name
+
+
+class RenderStats:
+    """Per-stage timings and per-trigger render counters.
+
+    Disabled, ``stage()`` hands back one shared no-op context manager and
+    ``count()`` returns immediately, so the hooks cost an attribute check.
+    """
+
+    def __init__(self, enabled: bool = False, history: int = 256):
+        self.enabled = enabled
+        self.history = history
+        self._lock = threading.Lock()
+        self._dump_thread: Optional[threading.Thread] = None
+        self._dump_stop = threading.Event()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+            self._recent: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.history))
+            self._triggers: Dict[str, int] = defaultdict(int)
+            self._errors: Deque[Dict[str, Any]] = deque(maxlen=50)
+
+    def stage(self, name: str) -> ContextManager[None]:
+        if not self.enabled:
+            return _NULL_STAGE
+        return _StageTimer(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._stages[name]
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            self._recent[name].append(seconds)
+
+    def count(self, trigger: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._triggers[trigger] += 1
+
+    def record_error(self, error: RenderError) -> None:
+        # Errors are always logged; they are only kept for snapshots when stats are on
+        logger.error("Render failed: %s", error, extra={"render_error": error.to_dict()})
+        if self.enabled:
+            with self._lock:
+                self._errors.append(error.to_dict())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for name, entry in self._stages.items():
+                recent = sorted(self._recent[name])
+                stages[name] = {
+                    "count": entry["count"],
+                    "total_ms": round(entry["total"] * 1000, 3),
+                    "mean_ms": round(entry["total"] / entry["count"] * 1000, 3),
+                    "p50_ms": round(recent[len(recent) // 2] * 1000, 3),
+                    "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 3),
+                    "max_ms": round(entry["max"] * 1000, 3),
+                }
+            return {
+                "time": time.time(),
+                "stages": stages,
+                "triggers": dict(self._triggers),
+                "errors": list(self._errors),
+            }
+
+    def dump(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(tmp_path, path)
+
+    def start_periodic(self, interval: float = 60.0, path: Optional[str] = None) -> None:
+        # Every interval, write a JSON snapshot to ``path`` or log a one-line summary
+        if self._dump_thread is not None:
+            return
+        if not path:
+            _ensure_handler(logger)
+        self._dump_stop.clear()
+
+        def run() -> None:
+            while not self._dump_stop.wait(interval):
+                if path:
+                    self.dump(path)
+                else:
+                    logger.info("Render stats: %s", json.dumps(self.snapshot()["stages"]))
+
+        self._dump_thread = threading.Thread(target=run, name="render-stats", daemon=True)
+        self._dump_thread.start()
+
+    def stop_periodic(self) -> None:
+        self._dump_stop.set()
+        self._dump_thread = None
+
+
+class StartupTimer:
+    """Milestones and per-module import durations from process start to the first preview.
+
+    Times are milliseconds since ``start`` (by default when this module was
+    first imported, i.e. right after the interpreter came up).
+    """
+
+    def __init__(self, start: Optional[float] = None, budget_ms: Optional[float] = None):
+        self.start = start if start is not None else _MODULE_START
+        self.budget_ms = budget_ms
+        self.marks: List[Tuple[str, float]] = []
+        # phase ("eager", "deferred") -> module -> ms
+        self.imports: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def mark(self, name: str) -> None:
+        with self._lock:
+            self.marks.append((name, time.perf_counter()))
+
+    def elapsed_ms(self, name: str) -> Optional[float]:
+        for mark, at in self.marks:
+            if mark == name:
+                return (at - self.start) * 1000
+        return None
+
+    def timed_import(self, *names: str, phase: str = "deferred") -> None:
+        # Imports modules (before the window or from a background thread) and records what each
+        # one cost; modules already pulled in by an earlier name are recorded as 0
+        for name in names:
+            started = time.perf_counter()
+            if name not in sys.modules:
+                importlib.import_module(name)
+            with self._lock:
+                self.imports[phase][name] = (time.perf_counter() - started) * 1000
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "marks_ms": {name: round((at - self.start) * 1000, 1) for name, at in self.marks},
+                "imports_ms": {phase: {name: round(ms, 1) for name, ms in modules.items()}
+                               for phase, modules in self.imports.items()},
+                "budget_ms": self.budget_ms,
+            }
+
+    def check(self, mark: str) -> bool:
+        # Logs the breakdown, as a warning when over budget
+        _ensure_handler(startup_logger)
+        elapsed = self.elapsed_ms(mark)
+        over = self.budget_ms is not None and elapsed is not None and elapsed > self.budget_ms
+        level = logging.WARNING if over else logging.INFO
+        startup_logger.log(level, "Startup %s after %.0f ms (budget %s ms): %s", mark, elapsed or -1,
+                           self.budget_ms, json.dumps(self.report()))
+        return not over
+
+
+def configure_from_env(target: Optional["RenderStats"] = None) -> "RenderStats":
+    # CATCHY_STATS=1 turns timing on; CATCHY_STATS_DUMP=<file> and CATCHY_STATS_INTERVAL=<seconds>
+    # add a periodic JSON dump (or a log line when no file is given)
+    target = target or stats
+    target.enabled = os.environ.get("CATCHY_STATS", "") not in ("", "0")
+    if target.enabled and (os.environ.get("CATCHY_STATS_DUMP") or os.environ.get("CATCHY_STATS_INTERVAL")):
+        target.start_periodic(float(os.environ.get("CATCHY_STATS_INTERVAL", "60")), os.environ.get("CATCHY_STATS_DUMP"))
+    return target
+
+
+stats = RenderStats()
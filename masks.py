@@ -0,0 +1,77 @@
+import os
+from typing import Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from asset_cache import AssetCache
+
+# Luminance below this counts as a "dark" area of a design
+DARK_THRESHOLD = 128
+
+
+def to_array(image: Image.Image) -> np.ndarray:
+    if image.mode != "L":
+        image = image.convert("L")
+    return np.asarray(image)
+
+
+def to_image(mask: np.ndarray) -> Image.Image:
+    return Image.fromarray(np.ascontiguousarray(mask, dtype=np.uint8), "L")
+
+
+def threshold(mask: np.ndarray, level: int = DARK_THRESHOLD, below: bool = True) -> np.ndarray:
+    # 255 where the pixel is below (or above) the level, 0 elsewhere
+    hit = mask < level if below else mask > level
+    return hit.astype(np.uint8) * np.uint8(255)
+
+
+def _rank_filter(mask: np.ndarray, size: int, reduce) -> np.ndarray:
+    # Separable square min/max filter with edge replication, matching ImageFilter.MinFilter/MaxFilter
+    if size < 1 or size % 2 == 0:
+        raise ValueError("Filter size must be a positive odd number")
+    if size == 1:
+        return mask.copy()
+    radius = size // 2
+    height, width = mask.shape
+    padded = np.pad(mask, radius, mode="edge")
+    rows = padded[:, 0:width].copy()
+    for dx in range(1, size):
+        reduce(rows, padded[:, dx:dx + width], out=rows)
+    out = rows[0:height].copy()
+    for dy in range(1, size):
+        reduce(out, rows[dy:dy + height], out=out)
+    return out
+
+
+def erode(mask: np.ndarray, size: int = 3) -> np.ndarray:
+    return _rank_filter(mask, size, np.minimum)
+
+
+def dilate(mask: np.ndarray, size: int = 3) -> np.ndarray:
+    return _rank_filter(mask, size, np.maximum)
+
+
+def combine(*masks: np.ndarray) -> np.ndarray:
+    # Pixel-wise darkest value, the array form of ImageChops.darker
+    return np.minimum.reduce(masks)
+
+
+def dark_mask(image: Image.Image, level: int = DARK_THRESHOLD) -> Image.Image:
+    return to_image(threshold(to_array(image), level))
+
+
+def cached_dark_mask(cache: AssetCache, path: str, size: Tuple[int, int], resample: int = Image.LANCZOS,
+                     mode: str = "fit", level: int = DARK_THRESHOLD) -> Image.Image:
+    # Stored alongside the design layer it is derived from, so invalidating the path drops both
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns, tuple(size), int(resample), f"{mode}:dark<{level}")
+    return cache.get_or_build(key, lambda: dark_mask(cache.get(path, size, resample, mode), level))
+
+
+def camera_blob_mask(image: Image.Image, blur_radius: float = 2, level: int = DARK_THRESHOLD) -> Image.Image:
+    # Dark circular blobs (camera lenses) in a design: threshold, open, smooth and threshold again.
+    # The Gaussian blurs stay in PIL's C implementation, everything else runs on arrays.
+    blurred = to_array(image.convert("L").filter(ImageFilter.GaussianBlur(radius=blur_radius)))
+    circles = dilate(erode(threshold(blurred, level)))
+    circles = to_array(to_image(circles).filter(ImageFilter.GaussianBlur(radius=blur_radius)))
+    return to_image(threshold(circles, level))
@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from catalog import CATALOG_PATH, AssetCatalog, find_images, load_catalog
+
+PYRAMID_DIR = "material_pyramids"
+# Materials outside the catalog: the textures the Godot scene uses
+EXTRA_MATERIAL_DIRS = ("material",)
+MIN_LEVEL_SIZE = 64
+
+# magic, version, level count, source mtime_ns, source file size; then one (width, height, offset) per level
+_HEADER = struct.Struct("<4sHHQQ")
+_LEVEL = struct.Struct("<IIQ")
+_MAGIC = b"CCMP"
+_VERSION = 1
+_ALIGN = mmap.ALLOCATIONGRANULARITY
+
+
+def _source_stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def cover_size(source_size: Tuple[int, int], target_size: Tuple[int, int]) -> Tuple[int, int]:
+    # Smallest aspect-preserving size of the source that covers the target, i.e. what
+    # ImageOps.fit resamples to before cropping
+    scale = max(target_size[0] / source_size[0], target_size[1] / source_size[1])
+    return max(1, round(source_size[0] * scale)), max(1, round(source_size[1] * scale))
+
+
+def level_sizes(source_size: Tuple[int, int], targets: Iterable[Tuple[int, int]] = ()) -> List[Tuple[int, int]]:
+    # Largest first: one level per target bigger than the source, the source itself, then halvings
+    sizes = {cover_size(source_size, target) for target in targets}
+    sizes = {size for size in sizes if size[0] > source_size[0]}
+    width, height = source_size
+    while True:
+        sizes.add((width, height))
+        if min(width, height) // 2 < MIN_LEVEL_SIZE:
+            break
+        width, height = width // 2, height // 2
+    return sorted(sizes, reverse=True)
+
+
+def write_pyramid(source_path: str, path: str, targets: Iterable[Tuple[int, int]] = ()) -> List[Tuple[int, int]]:
+    image = Image.open(source_path).convert("RGBA")
+    sizes = level_sizes(image.size, targets)
+    offsets = []
+    position = _HEADER.size + _LEVEL.size * len(sizes)
+    for width, height in sizes:
+        position = (position + _ALIGN - 1) // _ALIGN * _ALIGN
+        offsets.append(position)
+        position += width * height * 4
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(sizes), *_source_stamp(source_path)))
+        for (width, height), offset in zip(sizes, offsets):
+            f.write(_LEVEL.pack(width, height, offset))
+        for size, offset in zip(sizes, offsets):
+            level = image if size == image.size else image.resize(size, Image.LANCZOS)
+            f.seek(offset)
+            f.write(level.tobytes())
+    os.replace(tmp_path, path)
+    return sizes
+
+
+class MaterialPyramid:
+    """Raw RGBA levels of one material, memory-mapped read-only.
+
+    Levels are handed out as images backed by the mapping itself, so opening
+    many materials costs address space, not resident memory, and pages are
+    shared between processes rendering the same material.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, mtime_ns, file_size = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._map.close()
+            raise ValueError(f"Not a material pyramid: {path}")
+        self.stamp = (mtime_ns, file_size)
+        self.levels: List[Tuple[int, int, int]] = [_LEVEL.unpack_from(self._map, _HEADER.size + i * _LEVEL.size)
+                                                   for i in range(count)]
+        self._view = memoryview(self._map)
+
+    def level(self, index: int) -> Image.Image:
+        width, height, offset = self.levels[index]
+        return Image.frombuffer("RGBA", (width, height), self._view[offset:offset + width * height * 4],
+                                "raw", "RGBA", 0, 1)
+
+    def closest(self, size: Tuple[int, int], contain: bool = False) -> Image.Image:
+        # Smallest level that still covers ``size`` (or, with ``contain``, that is at least as
+        # large as the image scaled to fit inside it), so resampling only ever shrinks;
+        # the largest level when none does
+        index = 0
+        for i, (width, height, _) in enumerate(self.levels):
+            if contain and width < size[0] and height < size[1]:
+                break
+            if not contain and (width < size[0] or height < size[1]):
+                break
+            index = i
+        return self.level(index)
+
+    def close(self) -> None:
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            # Levels handed out earlier still use the mapping; it goes away with them
+            pass
+
+
+class PyramidStore:
+    """Pyramid files for material images, one ``<name>-<hash>.mip`` per source path.
+
+    ``source`` returns None for materials without an up-to-date pyramid, and
+    callers fall back to decoding the image file.
+    """
+
+    def __init__(self, root: str = PYRAMID_DIR):
+        self.root = root
+        self._open: Dict[str, MaterialPyramid] = {}
+        self._lock = threading.Lock()
+
+    def pyramid_path(self, source_path: str) -> str:
+        normalized = os.path.normpath(os.path.abspath(source_path))
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(self.root, f"{stem}-{hashlib.sha1(normalized.encode()).hexdigest()[:8]}.mip")
+
+    def open(self, source_path: str) -> Optional[MaterialPyramid]:
+        path = self.pyramid_path(source_path)
+        with self._lock:
+            pyramid = self._open.get(path)
+            try:
+                stamp = _source_stamp(source_path)
+                if pyramid is None and os.path.exists(path):
+                    pyramid = self._open[path] = MaterialPyramid(path)
+            except (OSError, ValueError):
+                return None
+            if pyramid is None or pyramid.stamp != stamp:
+                # Edited since the last build; decode the file until the pyramid is rebuilt
+                return None
+            return pyramid
+
+    def source(self, source_path: str, size: Tuple[int, int], contain: bool = False) -> Optional[Image.Image]:
+        pyramid = self.open(source_path)
+        return pyramid.closest(size, contain) if pyramid is not None else None
+
+    def build(self, source_paths: Iterable[str], targets: Sequence[Tuple[int, int]] = ()) -> Dict[str, int]:
+        # Rewrites only pyramids whose source changed
+        os.makedirs(self.root, exist_ok=True)
+        counts = {"built": 0, "unchanged": 0}
+        for source_path in source_paths:
+            if self.open(source_path) is not None:
+                counts["unchanged"] += 1
+                continue
+            path = self.pyramid_path(source_path)
+            with self._lock:
+                pyramid = self._open.pop(path, None)
+                if pyramid is not None:
+                    pyramid.close()
+            write_pyramid(source_path, path, targets)
+            counts["built"] += 1
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            for pyramid in self._open.values():
+                pyramid.close()
+            self._open.clear()
+
+
+def find_materials(catalog: Optional[AssetCatalog] = None, paths: Iterable[str] = EXTRA_MATERIAL_DIRS) -> List[str]:
+    # The catalog's materials plus extra files or directories
+    catalog = catalog if catalog is not None else load_catalog()
+    found = {path for path in (catalog.resolve("material", name) for name in catalog.names("material")) if path}
+    for path in paths:
+        found.update([path] if os.path.isfile(path) else find_images(path))
+    return sorted(found)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from export import print_size
+
+    parser = argparse.ArgumentParser(description="Build memory-mappable texture pyramids for material images")
+    parser.add_argument("paths", nargs="*", default=list(EXTRA_MATERIAL_DIRS),
+                        help="Material files or directories besides the catalog's")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Asset catalog index listing the materials")
+    parser.add_argument("--out", default=PYRAMID_DIR)
+    parser.add_argument("--dpi", type=int, action="append", help="Print resolutions to precompute levels for (default 300)")
+    parser.add_argument("--size", action="append", default=[], help="Extra export size to keep a cover level for, e.g. 1181x2362")
+    args = parser.parse_args(argv)
+
+    # Only print exports need levels beyond the halvings: they crop-fit (cover) the output, while the
+    # preview thumbnails into the canvas and never enlarges, so a level upscaled for it would change it
+    targets = [print_size(dpi=dpi) for dpi in args.dpi or [300]]
+    targets += [tuple(int(v) for v in size.split("x")) for size in args.size]
+    store = PyramidStore(args.out)
+    counts = store.build(find_materials(load_catalog(args.catalog), args.paths), targets)
+    store.close()
+    print(f"Built {counts['built']} pyramid(s), {counts['unchanged']} unchanged, in {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
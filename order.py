@@ -1,9 +1,34 @@
-import tkinter as tk
-from tkinter import ttk, filedialog
-from PIL import Image, ImageTk, ImageEnhance, ImageOps, ImageChops, ImageDraw, ImageFilter
-from typing import Dict, List, Optional, Tuple
+import time
+_STARTED = time.perf_counter()
+
+from instrumentation import StartupTimer
+
+# Imported one at a time so the startup report shows what each costs; the imports below then find
+# them in sys.modules
+EAGER_MODULES = ("tkinter", "PIL.ImageTk", "asset_cache", "catalog", "import_store", "material_pyramid", "preview_worker")
+_startup_timer = StartupTimer(_STARTED)
+_startup_timer.timed_import(*EAGER_MODULES, phase="eager")
+
 import os
-import shutil
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+from PIL import Image, ImageTk
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import threading
+
+from asset_cache import AssetCache, default_cache
+from catalog import AssetCatalog
+from import_store import ImportRecord, ImportStore
+from instrumentation import PHOTOIMAGE, RenderError, RenderStats, configure_from_env, startup_logger
+from material_pyramid import PyramidStore
+from preview_worker import PreviewWorker
+
+if TYPE_CHECKING:
+    from order_store import OrderStore
+    from render import CaseRenderer, RenderSpec
+
+# Pulled in after the first frame in the "deferred" startup mode; compositor/masks bring in numpy
+DEFERRED_MODULES = ("render", "compositor", "export", "order_store")
 
 class PhoneCaseOrderSystem:
     def __init__(self, root: tk.Tk):
@@ -13,13 +38,24 @@ class PhoneCaseOrderSystem:
         self.root.configure(background='#333333')
         self.root.resizable(False, False)
 
-        self.possible_designs: List[str] = ["None"] + ["Design1", "Design2", "Design3"]
-        self.possible_materials: List[str] = ["None"] + ["Leder", "Stoff", "Holz", "Plexiglas", "Kork"]
-        self.manufacturers: Dict[str, List[str]] = {
-            "Apple": ["iPhone SE", "iPhone 12", "iPhone 12 Pro", "iPhone 13", "iPhone 13 Pro"],
-            "Samsung": ["Galaxy S21", "Galaxy S21+", "Galaxy Note 20", "Galaxy A52", "Galaxy A52"],
-            "Google": ["Pixel 4", "Pixel 4a", "Pixel 5", "Pixel 5a", "Pixel 6"],
-        }
+        # "deferred" shows the window first and then imports the render stack, rescans assets and
+        # opens the order database in the background; "eager" does all of it before the window appears
+        self.startup_mode: str = os.environ.get("CATCHY_STARTUP", "deferred")
+        budget = os.environ.get("CATCHY_STARTUP_BUDGET_MS")
+        self.startup: StartupTimer = _startup_timer
+        self.startup.budget_ms = float(budget) if budget else 1000.0
+        self.startup.mark("imports")
+
+        # Designs, materials and imports come from the persisted catalog; only changed files are re-read.
+        # The index as last saved is enough to fill the comboboxes until the rescan is done
+        self.catalog: AssetCatalog = AssetCatalog()
+
+        # Fallback for models without catalog designs
+        self.default_designs: List[str] = ["None"] + ["Design1", "Design2", "Design3"]
+        self.possible_designs: List[str] = self.default_designs
+        self.possible_materials: List[str] = []
+        self.manufacturers: Dict[str, List[str]] = {}
+        self.apply_catalog()
 
         self.camera_specs: Dict[str, List[Tuple[int, int, int, int]]] = {}
 
@@ -29,21 +65,139 @@ class PhoneCaseOrderSystem:
         self.custom_img_position: Tuple[int, int] = (0, 0)
         self.custom_img_scale: float = 1.0
 
+        # Uploads are stored once per content hash together with a preview-sized RGBA proxy
+        self.import_store: ImportStore = ImportStore(proxy_size=self.custom_img_size)
+        self.custom_img_record: Optional[ImportRecord] = None
+
+        # Print export re-renders the composition at this resolution instead of grabbing the preview;
+        # None means export.PRINT_DPI
+        self.export_dpi: Optional[int] = None
+
+        # Decoded and resized design/material layers, shared across renders
+        self.asset_cache: AssetCache = default_cache
+        # Materials with a prebuilt pyramid (python material_pyramid.py) are memory-mapped instead of decoded
+        self.asset_cache.pyramids = PyramidStore()
+        self.renderer: "Optional[CaseRenderer]" = None  # created once the render modules are loaded
+
+        # Per-stage timings and renders per trigger; off unless CATCHY_STATS=1 (see instrumentation.py)
+        self.stats: RenderStats = configure_from_env()
+
+        # CATCHY_PREVIEW_MODE: "progressive" (default) shows a cheap draft while edits arrive and a
+        # full-quality frame once idle; "draft" and "full" always render that tier
+        preview_mode = os.environ.get("CATCHY_PREVIEW_MODE", "progressive")
+        self.preview_mode: str = preview_mode if preview_mode in ("draft", "full") else "progressive"
+        self.preview_idle_ms: int = 300
+        self.preview_tier: Optional[str] = None  # tier that produced the frame currently shown
+        self._full_render_job: Optional[str] = None
+
         self.manufacturer_var: tk.StringVar = tk.StringVar()
         self.model_var: tk.StringVar = tk.StringVar()
         self.design_var: tk.StringVar = tk.StringVar()
         self.material_var: tk.StringVar = tk.StringVar()
         self.custom_image_var: tk.StringVar = tk.StringVar()
+        self.email_var: tk.StringVar = tk.StringVar()
+        self.amount_var: tk.StringVar = tk.StringVar(value="1")
+
+        # One row per order line with the quantity as a field, written in batches
+        self.order_store: "Optional[OrderStore]" = None
+        self._deferred: Dict[str, object] = {}
 
         # Set default values for the comboboxes
         self.manufacturer_var.set(list(self.manufacturers.keys())[0])
         self.model_var.set(self.manufacturers[self.manufacturer_var.get()][0])
+        self.possible_designs = self.designs_for_model()
         self.design_var.set(self.possible_designs[0])
         self.material_var.set(self.possible_materials[0])
         self.custom_image_var.set("None")
 
         self.setup_ui()
 
+        # Renders run off the Tk thread; only the finished frame comes back via after()
+        self.preview_worker: PreviewWorker = PreviewWorker(self.root, self.render_preview, self.show_preview, self.report_preview_error)
+        self.startup.mark("window")
+
+        if self.startup_mode == "eager":
+            self.finish_startup(self.load_deferred())
+        # Idle callbacks run after Tk has drawn the widgets created above
+        self.root.after_idle(self.start_deferred)
+
+    def apply_catalog(self) -> None:
+        self.possible_materials = ["None"] + (self.catalog.names("material") or ["Leder", "Stoff", "Holz", "Plexiglas", "Kork"])
+        self.manufacturers = self.catalog.manufacturers() or {
+            "Apple": ["iPhone SE", "iPhone 12", "iPhone 12 Pro", "iPhone 13", "iPhone 13 Pro"],
+            "Samsung": ["Galaxy S21", "Galaxy S21+", "Galaxy Note 20", "Galaxy A52", "Galaxy A52"],
+            "Google": ["Pixel 4", "Pixel 4a", "Pixel 5", "Pixel 5a", "Pixel 6"],
+        }
+
+    def start_deferred(self) -> None:
+        self.startup.mark("first_frame")
+        if self.renderer is not None:
+            # Eager startup already loaded everything
+            return
+
+        def run() -> None:
+            try:
+                self._deferred["result"] = self.load_deferred()
+            except Exception as e:
+                self._deferred["error"] = e
+
+        threading.Thread(target=run, name="startup", daemon=True).start()
+        self.root.after(10, self.poll_deferred)
+
+    def poll_deferred(self) -> None:
+        # Tk is only touched from its own thread, so the result is picked up here
+        if "result" in self._deferred:
+            self.finish_startup(self._deferred["result"])
+        elif "error" in self._deferred:
+            # Without the render modules there is no preview at all; say so instead of staying blank
+            self.report_preview_error(self._deferred["error"])
+            messagebox.showerror("Error", f"Vorschau konnte nicht geladen werden: {self._deferred['error']}")
+        else:
+            self.root.after(10, self.poll_deferred)
+
+    def load_deferred(self) -> Tuple[AssetCatalog, "Optional[OrderStore]"]:
+        # Safe off the Tk thread: imports, a fresh catalog and the order database touch no widgets.
+        # Only the imports are required; a failed rescan keeps the saved index, a failed import
+        # adoption is retried next start and the order database is opened again on the first order
+        self.startup.timed_import(*DEFERRED_MODULES)
+        from order_store import OrderStore
+        catalog = self.catalog
+        order_store = None
+        try:
+            catalog = AssetCatalog(self.catalog.index_path)
+            catalog.refresh()
+        except Exception:
+            catalog = self.catalog
+            startup_logger.exception("Asset rescan failed; using the saved catalog")
+        try:
+            self.import_store.adopt_loose_files()
+        except Exception:
+            startup_logger.exception("Adopting loose import files failed")
+        try:
+            order_store = OrderStore()
+        except Exception:
+            startup_logger.exception("Opening the order database failed")
+        self.startup.mark("deferred_loaded")
+        return catalog, order_store
+
+    def finish_startup(self, loaded: Tuple[AssetCatalog, "Optional[OrderStore]"]) -> None:
+        from render import CaseRenderer
+        self.catalog, self.order_store = loaded
+        self.renderer = CaseRenderer(self.asset_cache, self.catalog)
+        # The rescan may have found or dropped models, designs or materials; selections made
+        # meanwhile are kept where they are still offered
+        self.apply_catalog()
+        self.manufacturer_combobox['values'] = list(self.manufacturers.keys())
+        if self.manufacturer_var.get().strip() not in self.manufacturers:
+            self.manufacturer_var.set(next(iter(self.manufacturers)))
+        self.populate_models()
+        self.material_combobox['values'] = self.possible_materials
+        if self.material_var.get() not in self.possible_materials:
+            self.material_var.set(self.possible_materials[0])
+        self.populate_designs()
+        self.export_button.configure(state=tk.NORMAL)
+        self.update_preview(trigger="startup")
+
     def setup_ui(self):
         style = ttk.Style()
         style.theme_use("clam")
@@ -70,6 +224,7 @@ class PhoneCaseOrderSystem:
         ttk.Label(manufacturer_model_frame, text="Modell:").grid(row=0, column=2, padx=5, pady=5, sticky=tk.E)
         self.model_combobox = ttk.Combobox(manufacturer_model_frame, textvariable=self.model_var, state="readonly")
         self.model_combobox.grid(row=0, column=3, padx=5, pady=5)
+        self.model_combobox.bind("<<ComboboxSelected>>", self.update_designs)
 
         design_material_frame = ttk.Frame(options_frame)
         design_material_frame.pack(side=tk.TOP, pady=5)
@@ -85,7 +240,9 @@ class PhoneCaseOrderSystem:
         self.material_combobox.bind("<<ComboboxSelected>>", self.update_preview)
 
         ttk.Label(design_material_frame, text="Custom Image:").grid(row=0, column=4, padx=5, pady=5, sticky=tk.E)
-        self.custom_image_combobox = ttk.Combobox(design_material_frame, textvariable=self.custom_image_var, values=["None"] + self.list_custom_images())
+        # Filled when the list is opened, so startup never waits on the import store
+        self.custom_image_combobox = ttk.Combobox(design_material_frame, textvariable=self.custom_image_var, values=["None"],
+                                                  postcommand=self.refresh_custom_images)
         self.custom_image_combobox.grid(row=0, column=5, padx=5, pady=5)
         self.custom_image_combobox.bind("<<ComboboxSelected>>", self.load_custom_image)
 
@@ -93,7 +250,18 @@ class PhoneCaseOrderSystem:
         buttons_frame.pack(side=tk.TOP, pady=5)
 
         ttk.Button(buttons_frame, text="Bild importieren", command=self.import_custom_image).grid(row=0, column=0, padx=5, pady=5)
-        ttk.Button(buttons_frame, text="Vorschau exportieren", command=self.export_preview).grid(row=0, column=1, padx=5, pady=5)
+        # Enabled by finish_startup; the print export renders through self.renderer
+        self.export_button = ttk.Button(buttons_frame, text="Vorschau exportieren", command=self.export_preview, state=tk.DISABLED)
+        self.export_button.grid(row=0, column=1, padx=5, pady=5)
+
+        order_frame = ttk.Frame(options_frame)
+        order_frame.pack(side=tk.TOP, pady=5)
+
+        ttk.Label(order_frame, text="E-Mail:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.E)
+        ttk.Entry(order_frame, textvariable=self.email_var, width=30).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(order_frame, text="Menge:").grid(row=0, column=2, padx=5, pady=5, sticky=tk.E)
+        ttk.Spinbox(order_frame, textvariable=self.amount_var, from_=1, to=100000, width=8).grid(row=0, column=3, padx=5, pady=5)
+        ttk.Button(order_frame, text="Bestellen", command=self.place_order).grid(row=0, column=4, padx=5, pady=5)
 
         # Create a frame for the preview image in the center
         preview_frame = ttk.Frame(self.root, padding="10 10 10 10")
@@ -117,95 +285,184 @@ class PhoneCaseOrderSystem:
         manufacturer = self.manufacturer_var.get().strip()
         self.model_combobox.set("")
         if manufacturer in self.manufacturers:
-            self.model_combobox['values'] = self.manufacturers[manufacturer]
-            self.model_var.set(self.manufacturers[manufacturer][0])  # Set default model
+            self.populate_models()
+            self.update_designs()
+
+    def populate_models(self) -> None:
+        models = self.manufacturers.get(self.manufacturer_var.get().strip(), [])
+        self.model_combobox['values'] = models
+        if models and self.model_var.get() not in models:
+            self.model_var.set(models[0])  # Set default model
+
+    def designs_for_model(self) -> List[str]:
+        designs = self.catalog.designs(self.manufacturer_var.get().strip(), self.model_var.get().strip())
+        if not designs:
+            return self.default_designs
+        return ["None"] + [entry.name for entry in designs]
+
+    def update_designs(self, event: Optional[tk.Event] = None) -> None:
+        self.populate_designs()
+        self.update_preview()
+
+    def populate_designs(self) -> None:
+        self.possible_designs = self.designs_for_model()
+        self.design_combobox['values'] = self.possible_designs
+        if self.design_var.get() not in self.possible_designs:
+            self.design_var.set(self.possible_designs[0])
 
     def import_custom_image(self) -> None:
         filepath = filedialog.askopenfilename(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp")])
         if filepath:
-            self.custom_img = Image.open(filepath).convert("RGBA")
-            self.custom_img.thumbnail(self.custom_img_size, Image.LANCZOS)
-            self.save_custom_image(filepath)
+            try:
+                record = self.save_custom_image(filepath)
+            except OSError as e:
+                messagebox.showerror("Error", f"Bild konnte nicht importiert werden: {e}")
+                return
+            self.custom_img_record = record
+            self.custom_img = self.import_store.load_proxy(record)
             self.custom_image_combobox['values'] = ["None"] + self.list_custom_images()
-            self.custom_image_var.set(os.path.basename(filepath))
-            self.update_preview()
+            self.custom_image_var.set(record.name)
+            self.update_preview(trigger="import")
 
-    def save_custom_image(self, filepath: str) -> None:
-        if not os.path.exists("imports"):
-            os.makedirs("imports")
-        shutil.copy(filepath, os.path.join("imports", os.path.basename(filepath)))
+    def save_custom_image(self, filepath: str) -> ImportRecord:
+        record, _ = self.import_store.add(filepath)
+        return record
 
     def list_custom_images(self) -> List[str]:
-        if not os.path.exists("imports"):
-            return []
-        return [f for f in os.listdir("imports") if f.endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+        return self.import_store.names()
+
+    def refresh_custom_images(self) -> None:
+        self.custom_image_combobox['values'] = ["None"] + self.list_custom_images()
 
     def load_custom_image(self, event: Optional[tk.Event] = None) -> None:
         selected_image = self.custom_image_var.get().strip()
-        if selected_image != "None":
-            filepath = os.path.join("imports", selected_image)
-            self.custom_img = Image.open(filepath).convert("RGBA")
-            self.custom_img.thumbnail(self.custom_img_size, Image.LANCZOS)
-        else:
-            self.custom_img = None
+        record = self.import_store.find(selected_image) if selected_image != "None" else None
+        self.custom_img_record = record
+        self.custom_img = self.import_store.load_proxy(record) if record is not None else None
         self.update_preview()
 
     def move_custom_image(self, dx: int, dy: int) -> None:
         self.custom_img_position = (self.custom_img_position[0] + dx, self.custom_img_position[1] + dy)
-        self.update_preview()
+        self.update_preview(trigger="move")
 
     def scale_custom_image(self, scale_factor: float) -> None:
         self.custom_img_scale *= scale_factor
-        self.update_preview()
-
-    def update_preview(self, event: Optional[tk.Event] = None) -> None:
+        self.update_preview(trigger="zoom")
+
+    def current_spec(self) -> "RenderSpec":
+        from render import RenderSpec
+        return RenderSpec(
+            manufacturer=self.manufacturer_var.get().strip(),
+            model=self.model_var.get().strip(),
+            design=self.design_var.get().strip(),
+            material=self.material_var.get().strip(),
+            position=self.custom_img_position,
+            scale=self.custom_img_scale,
+            size=self.custom_img_size,
+        )
+
+    def update_preview(self, event: Optional[tk.Event] = None, trigger: str = "combobox") -> None:
+        # Only the layers touched since the last render are rebuilt
+        if self.renderer is None:
+            # Still starting up; finish_startup renders whatever is selected by then
+            return
+        from compositor import TIER_DRAFT
+        if self.preview_mode != "progressive":
+            self.preview_worker.submit(self.current_spec(), self.custom_img, self.preview_mode, trigger)
+            return
+        self.preview_worker.submit(self.current_spec(), self.custom_img, TIER_DRAFT, trigger)
+        if self._full_render_job is not None:
+            self.root.after_cancel(self._full_render_job)
+        self._full_render_job = self.root.after(self.preview_idle_ms, self.render_full_quality)
+
+    def render_full_quality(self) -> None:
+        from compositor import TIER_FULL
+        self._full_render_job = None
+        # Counted apart from the edit that scheduled it, which was counted for its draft
+        self.preview_worker.submit(self.current_spec(), self.custom_img, TIER_FULL, "idle")
+
+    def render_preview(self, spec: "RenderSpec", custom_img: Optional[Image.Image], tier: str,
+                       trigger: str = "") -> Tuple[Image.Image, str]:
+        # Runs on the preview worker thread. Counted here rather than on submit, so submits the
+        # worker coalesced do not show up as renders
+        self.stats.count(trigger)
         try:
-            design = self.design_var.get().strip()
-            material = self.material_var.get().strip()
-            max_size = self.custom_img_size
-
-            # Base image
-            final_image = Image.new('RGBA', max_size, (255, 255, 255, 0))
-
-            # Load and process design image
-            if design != "None":
-                design_image_path = f'images/{design}.png'
-                design_image = Image.open(design_image_path).convert("RGBA")
-                design_image.thumbnail(max_size, Image.LANCZOS)
-                design_image = ImageOps.fit(design_image, max_size, Image.LANCZOS)
-                final_image = Image.alpha_composite(final_image, design_image)
-
-            # Load and process material image
-            if material != "None":
-                material_image_path = f'images/{material}.png'
-                material_image = Image.open(material_image_path).convert("RGBA")
-                material_image.thumbnail(max_size, Image.LANCZOS)
-                material_image = ImageOps.fit(material_image, max_size, Image.LANCZOS)
-                mask = design_image.convert("L").point(lambda x: 255 if x < 128 else 0)
-                final_image.paste(material_image, (0, 0), mask)
-
-            # Load and process custom image
-            if self.custom_img:
-                custom_img_resized = self.custom_img.resize((int(self.custom_img.width * self.custom_img_scale), int(self.custom_img.height * self.custom_img_scale)), Image.LANCZOS)
-                custom_img_resized = custom_img_resized.convert("RGBA")
-                custom_img_resized = ImageOps.fit(custom_img_resized, max_size, Image.LANCZOS)
-                mask = design_image.convert("L").point(lambda x: 255 if x < 128 else 0)
-                final_image.paste(custom_img_resized, self.custom_img_position, mask)
+            return self.renderer.render(spec, custom_img, tier), tier
+        except Exception as e:
+            raise RenderError(e, trigger, spec.to_dict()) from e
 
+    def show_preview(self, frame: Tuple[Image.Image, str]) -> None:
+        final_image, self.preview_tier = frame
+        with self.stats.stage(PHOTOIMAGE):
             combined_img = ImageTk.PhotoImage(final_image)
-            self.preview_label.configure(image=combined_img)
-            self.preview_label.image = combined_img
+        self.preview_label.configure(image=combined_img)
+        self.preview_label.image = combined_img
+        if self.startup.elapsed_ms("first_preview") is None:
+            self.startup.mark("first_preview")
+            self.startup.check("first_preview")
 
-        except Exception as e:
-            print(f"Error loading images: {e}")
+    def report_preview_error(self, e: Exception) -> None:
+        self.stats.record_error(e if isinstance(e, RenderError) else RenderError(e))
 
     def export_preview(self) -> None:
-        filepath = filedialog.asksaveasfilename(defaultextension=".jpg", filetypes=[("JPEG files", "*.jpg")])
+        # PNG and TIFF are streamed to disk; JPEG holds the whole print image in memory (3 bytes per pixel)
+        filepath = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[
+            ("PNG files", "*.png"), ("TIFF files", "*.tif"), ("JPEG files (whole image in memory)", "*.jpg")])
         if filepath:
-            final_image = self.preview_label.image
-            if isinstance(final_image, ImageTk.PhotoImage):
-                final_image = ImageTk.getimage(final_image)
-                final_image.convert("RGB").save(filepath, "JPEG")
+            custom_path = self.import_store.original_path(self.custom_img_record) if self.custom_img_record else None
+            # Tiled and streamed to disk; runs in the background so the window stays responsive
+            outcome: Dict[str, Any] = {}
+            threading.Thread(target=self.export_print_file, args=(filepath, self.current_spec(), custom_path, outcome),
+                             daemon=True).start()
+            self.root.after(50, self.poll_export, filepath, outcome)
+
+    def export_print_file(self, filepath: str, spec: "RenderSpec", custom_path: Optional[str], outcome: Dict[str, Any]) -> None:
+        # Runs off the Tk thread; poll_export reports the outcome
+        from export import PRINT_DPI, export_print, print_size
+        dpi = self.export_dpi or PRINT_DPI
+        try:
+            export_print(spec, filepath, print_size(dpi=dpi), dpi, custom_path=custom_path,
+                         resolve=self.renderer.resolve, pyramids=self.asset_cache.pyramids)
+            outcome["done"] = True
+        except Exception as e:
+            self.stats.record_error(RenderError(e, "export", spec.to_dict()))
+            outcome["error"] = e
+
+    def poll_export(self, filepath: str, outcome: Dict[str, Any]) -> None:
+        if "done" in outcome:
+            messagebox.showinfo("Export", f"Druckdatei gespeichert: {filepath}")
+        elif "error" in outcome:
+            messagebox.showerror("Error", f"Export fehlgeschlagen: {outcome['error']}")
+        else:
+            self.root.after(50, self.poll_export, filepath, outcome)
+
+    def place_order(self) -> None:
+        from order_store import OrderError, OrderLine, OrderStore, summary
+        if self.order_store is None:
+            self.order_store = OrderStore()
+        try:
+            amount = int(self.amount_var.get())
+        except ValueError:
+            amount = 0
+        line = OrderLine(
+            email=self.email_var.get().strip(),
+            manufacturer=self.manufacturer_var.get().strip(),
+            model=self.model_var.get().strip(),
+            design=self.design_var.get().strip(),
+            material=self.material_var.get().strip(),
+            quantity=amount,
+            custom_image=self.custom_img_record.digest if self.custom_img_record else "",
+            position_x=self.custom_img_position[0],
+            position_y=self.custom_img_position[1],
+            scale=self.custom_img_scale,
+        )
+        try:
+            self.order_store.add(line)
+            self.order_store.flush()
+        except OrderError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        messagebox.showinfo("Order Summary", summary([line]) + f"\nWe will send you a quote for your cases via email to {line.email}.")
 
     def move_custom_image(self, dx: int, dy: int) -> None:
         new_position = (self.custom_img_position[0] + dx, self.custom_img_position[1] + dy)
@@ -213,11 +470,11 @@ class PhoneCaseOrderSystem:
         max_y = self.custom_img_size[1] - int(self.custom_img.height * self.custom_img_scale)
         new_position = (max(0, min(new_position[0], max_x)), max(0, min(new_position[1], max_y)))
         self.custom_img_position = new_position
-        self.update_preview()
+        self.update_preview(trigger="move")
 
     def scale_custom_image(self, scale_factor: float) -> None:
         self.custom_img_scale *= scale_factor
-        self.update_preview()
+        self.update_preview(trigger="zoom")
         
 if __name__ == "__main__":
     root = tk.Tk()
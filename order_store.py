@@ -0,0 +1,186 @@
+import argparse
+import re
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from operator import attrgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ORDERS_PATH = "orders.sqlite3"
+EMAIL_REGEX = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+
+# Columns that can be filtered and grouped on; each has an index that also covers quantity,
+# so totals are answered from the index without touching the table
+INDEXED_FIELDS = ("model", "design", "material", "email")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_lines (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL,
+    manufacturer TEXT NOT NULL,
+    model TEXT NOT NULL,
+    design TEXT NOT NULL,
+    material TEXT NOT NULL,
+    custom_image TEXT NOT NULL DEFAULT '',
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    created_at REAL NOT NULL,
+    position_x INTEGER NOT NULL DEFAULT 0,
+    position_y INTEGER NOT NULL DEFAULT 0,
+    scale REAL NOT NULL DEFAULT 1.0
+);
+CREATE INDEX IF NOT EXISTS idx_order_lines_model ON order_lines (model, manufacturer, quantity);
+CREATE INDEX IF NOT EXISTS idx_order_lines_design ON order_lines (design, quantity);
+CREATE INDEX IF NOT EXISTS idx_order_lines_material ON order_lines (material, quantity);
+CREATE INDEX IF NOT EXISTS idx_order_lines_email ON order_lines (email, quantity);
+"""
+
+
+class OrderError(ValueError):
+    pass
+
+
+@dataclass
+class OrderLine:
+    email: str
+    manufacturer: str
+    model: str
+    design: str
+    material: str
+    quantity: int = 1
+    custom_image: str = ""  # import digest, empty without a custom image
+    created_at: float = field(default_factory=time.time)
+    # Where the custom image sits, in preview pixels as in RenderSpec
+    position_x: int = 0
+    position_y: int = 0
+    scale: float = 1.0
+
+    def validate(self) -> None:
+        if not EMAIL_REGEX.match(self.email):
+            raise OrderError("Invalid email address. Please try again.")
+        if not self.manufacturer or not self.model:
+            raise OrderError("The fields 'Manufacturer' and 'Model' cannot be empty. Please select a manufacturer and a model.")
+        if self.quantity <= 0:
+            raise OrderError("Invalid amount. Must be greater than 0.")
+
+
+_COLUMNS = tuple(f.name for f in fields(OrderLine))
+# Much cheaper than dataclasses.astuple, which deep-copies every field
+_row = attrgetter(*_COLUMNS)
+
+
+class OrderStore:
+    """SQLite-backed order lines; one row per line with the quantity as a column.
+
+    ``add`` buffers lines and writes them with ``executemany`` in a single
+    transaction every ``batch_size`` lines (or on ``flush``/``close``).
+    """
+
+    def __init__(self, path: str = ORDERS_PATH, batch_size: int = 5000):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: List[OrderLine] = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Keep the four secondary indexes in memory while large batches go in
+        self._conn.execute("PRAGMA cache_size=-65536")
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self) -> "OrderStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add(self, line: OrderLine) -> None:
+        line.validate()
+        with self._lock:
+            self._pending.append(line)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def add_many(self, lines: Iterable[OrderLine]) -> None:
+        for line in lines:
+            self.add(line)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        with self._conn:
+            self._conn.executemany(f"INSERT INTO order_lines ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                                   map(_row, self._pending))
+        self._pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    def _where(self, filters: Dict[str, Optional[str]]) -> Tuple[str, List[str]]:
+        clauses, params = [], []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in INDEXED_FIELDS and name != "manufacturer":
+                raise OrderError(f"Cannot filter on {name}")
+            clauses.append(f"{name} = ?")
+            params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def lines(self, limit: Optional[int] = None, **filters: Optional[str]) -> List[OrderLine]:
+        self.flush()
+        where, params = self._where(filters)
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM order_lines{where} ORDER BY id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [OrderLine(*row) for row in self._conn.execute(sql, params)]
+
+    def totals(self, by: str = "model", **filters: Optional[str]) -> List[Tuple[str, int, int]]:
+        # (key, number of lines, number of cases) per group, largest first
+        if by not in INDEXED_FIELDS:
+            raise OrderError(f"Cannot group by {by}")
+        self.flush()
+        where, params = self._where(filters)
+        key = "manufacturer || ' ' || model" if by == "model" else by
+        sql = (f"SELECT {key}, COUNT(*), SUM(quantity) FROM order_lines{where} "
+               f"GROUP BY {'model, manufacturer' if by == 'model' else by} ORDER BY 3 DESC")
+        return [tuple(row) for row in self._conn.execute(sql, params)]
+
+    def count(self) -> int:
+        self.flush()
+        return self._conn.execute("SELECT COUNT(*) FROM order_lines").fetchone()[0]
+
+
+def summary(lines: Iterable[OrderLine]) -> str:
+    # Same wording as the order summary dialog in main_control.gd
+    text = "Order Summary:\n"
+    for line in lines:
+        text += (f"{line.manufacturer} {line.model}: {line.quantity} case(s) with design '{line.design}' "
+                 f"made of '{line.material}' ordered.\n")
+    return text
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Query the order store")
+    parser.add_argument("--db", default=ORDERS_PATH)
+    parser.add_argument("--by", choices=INDEXED_FIELDS, default="model", help="Group totals by this field")
+    for name in INDEXED_FIELDS:
+        parser.add_argument(f"--{name}", help=f"Only orders with this {name}")
+    args = parser.parse_args(argv)
+
+    with OrderStore(args.db) as store:
+        filters = {name: getattr(args, name) for name in INDEXED_FIELDS}
+        for key, line_count, cases in store.totals(args.by, **filters):
+            print(f"{key}: {cases} case(s) in {line_count} order line(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
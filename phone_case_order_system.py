@@ -1,8 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
-from PIL import Image, ImageTk, ImageEnhance, ImageOps, ImageChops, ImageDraw, ImageFilter
+from PIL import Image, ImageTk
 from typing import Dict, List, Optional, Tuple
-import numpy as np
+
+from camera_atlas import CameraAtlas
+from asset_cache import AssetCache, default_cache
+from instrumentation import EXPORT_ENCODE, PHOTOIMAGE, RenderError, RenderStats, configure_from_env
+from render import CaseRenderer, RenderSpec
 
 class PhoneCaseOrderSystem:
     def __init__(self, root: tk.Tk):
@@ -20,12 +24,19 @@ class PhoneCaseOrderSystem:
             "Google": ["Pixel 4", "Pixel 4a", "Pixel 5", "Pixel 5a", "Pixel 6"],
         }
 
-        self.camera_specs: Dict[str, List[Tuple[int, int, int, int]]] = {}
-
         self.custom_img: Optional[Image.Image] = None
         self.custom_img_opacity: float = 0.9
         self.custom_img_size: Tuple[int, int] = (540, 540)
 
+        # Decoded and resized design/material layers, shared across renders
+        self.asset_cache: AssetCache = default_cache
+        # Same pipeline as order.py and the batch renderer, on a 540x540 canvas. Prebuilt cutout
+        # masks (python camera_atlas.py) are used; missing entries fall back to CAMERA_SPECS and detection
+        self.renderer: CaseRenderer = CaseRenderer(self.asset_cache, camera_atlas=CameraAtlas())
+
+        # Per-stage timings and renders per trigger; off unless CATCHY_STATS=1 (see instrumentation.py)
+        self.stats: RenderStats = configure_from_env()
+
         self.manufacturer_var: tk.StringVar = tk.StringVar()
         self.model_var: tk.StringVar = tk.StringVar()
         self.design_var: tk.StringVar = tk.StringVar()
@@ -97,74 +108,30 @@ class PhoneCaseOrderSystem:
         if filepath:
             self.custom_img = Image.open(filepath).convert("RGBA")
             self.custom_img.thumbnail(self.custom_img_size)
-            self.update_preview()
+            self.update_preview(trigger="import")
 
-    def update_preview(self, event: Optional[tk.Event] = None) -> None:
+    def update_preview(self, event: Optional[tk.Event] = None, trigger: str = "combobox") -> None:
         # Update the preview image based on the selected options
-        design = self.design_var.get().strip()
-        material = self.material_var.get().strip()
-        model = self.model_var.get().strip()
-        max_size = 540
-
-        if design:
+        self.stats.count(trigger)
+        spec = RenderSpec(
+            manufacturer=self.manufacturer_var.get().strip(),
+            model=self.model_var.get().strip(),
+            design=self.design_var.get().strip(),
+            material=self.material_var.get().strip(),
+            size=self.custom_img_size,
+        )
+
+        if spec.design:
             try:
-                design_image = Image.open(f'images/{design}.png')
-                w_d, h_d = design_image.size
-                aspect_ratio = w_d / h_d
-
-                if aspect_ratio > 1:
-                    new_width = max_size
-                    new_height = int(max_size / aspect_ratio)
-                else:
-                    new_height = max_size
-                    new_width = int(max_size * aspect_ratio)
-
-                design_image = design_image.resize((new_width, new_height), Image.LANCZOS)
-                design_canvas = Image.new('RGBA', (max_size, max_size), (255, 255, 255, 0))
-                design_x = (max_size - new_width) // 2
-                design_y = (max_size - new_height) // 2
-                design_canvas.paste(design_image, (design_x, design_y), design_image)
-
-                # Create a mask from the dark areas of the design image
-                design_mask = design_canvas.convert("L").point(lambda p: 255 if p < 128 else 0)
-
-                final_image = design_canvas.copy()
-
-                if material:
-                    material_image = Image.open(f'images/{material}.png')
-                    material_image = material_image.resize((max_size, max_size), Image.LANCZOS)
-                    material_image = material_image.convert("RGBA")
-
-                    # Apply the design mask to the material image
-                    material_image.putalpha(design_mask)
-
-                    camera_mask = self.detect_and_create_camera_mask(model)
-                    if camera_mask:
-                        combined_mask = ImageChops.darker(design_mask, camera_mask)
-                    else:
-                        combined_mask = design_mask
-
-                    final_image.paste(material_image, (0, 0), combined_mask)
-
-                if self.custom_img:
-                    custom_img_resized = self.custom_img.resize(self.custom_img_size, Image.LANCZOS)
-                    custom_img_resized = custom_img_resized.convert("RGBA")
-
-                    # Create a mask from the custom image
-                    custom_mask = custom_img_resized.convert("L").point(lambda p: 255 if p > 128 else 0)
-                    custom_img_resized.putalpha(custom_mask)
-
-                    # Apply the design mask to the custom image
-                    custom_img_resized.putalpha(design_mask)
-
-                    final_image.paste(custom_img_resized, (0, 0), custom_img_resized)
+                final_image = self.renderer.render(spec, self.custom_img)
 
-                combined_img = ImageTk.PhotoImage(final_image)
+                with self.stats.stage(PHOTOIMAGE):
+                    combined_img = ImageTk.PhotoImage(final_image)
                 self.preview_label.configure(image=combined_img)
                 self.preview_label.image = combined_img
 
             except Exception as e:
-                print(f"Error loading images: {e}")
+                self.stats.record_error(RenderError(e, trigger, spec.to_dict()))
 
     def export_preview(self) -> None:
         filepath = filedialog.asksaveasfilename(defaultextension=".jpg", filetypes=[("JPEG files", "*.jpg")])
@@ -172,33 +139,10 @@ class PhoneCaseOrderSystem:
             final_image = self.preview_label.image
             if isinstance(final_image, ImageTk.PhotoImage):
                 final_image = ImageTk.getimage(final_image)
-                final_image.convert("RGB").save(filepath, "JPEG")
-
-    def detect_and_create_camera_mask(self, model: str) -> Optional[Image.Image]:
-        max_size = 540
-        mask = Image.new("L", (max_size, max_size), 255)
-        draw = ImageDraw.Draw(mask)
-
-        if model in self.camera_specs:
-            for spec in self.camera_specs[model]:
-                draw.rectangle(spec, fill="black")
-        else:
-            # Detect dark circles in the design image
-            design_image = Image.open(f'images/{self.design_var.get()}.png')
-            design_image = design_image.resize((max_size, max_size), Image.LANCZOS)
-            design_image = design_image.convert("L")
-            blurred = design_image.filter(ImageFilter.GaussianBlur(radius=2))
-            circles = blurred.point(lambda p: 255 if p < 128 else 0)
-            circles = circles.filter(ImageFilter.MinFilter(3))
-            circles = circles.filter(ImageFilter.MaxFilter(3))
-            circles = circles.filter(ImageFilter.GaussianBlur(radius=2))
-            circles = circles.point(lambda p: 255 if p < 128 else 0)
-
-            mask.paste(circles, (0, 0))
-
-        return mask
+                with self.stats.stage(EXPORT_ENCODE):
+                    final_image.convert("RGB").save(filepath, "JPEG")
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = PhoneCase OrderSystem(root)
+    app = PhoneCaseOrderSystem(root)
     root.mainloop()
\ No newline at end of file
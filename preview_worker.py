@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+@dataclass
+class _Request:
+    generation: int
+    args: tuple
+    submitted_at: float
+
+
+class PreviewWorker:
+    """Renders previews on a background thread, latest request wins.
+
+    ``submit`` is called from the Tk thread and only replaces a single pending
+    slot, so bursts of button events collapse into one render. The worker waits
+    for ``debounce_ms`` of quiet (at most ``max_wait_ms`` during a continuous
+    burst) and renders. Whatever ``render`` returns (normally a PIL image) is
+    the frame. Finished frames are picked up on the Tk thread through
+    ``after()`` and passed to ``on_ready`` when they are newer than the frame
+    on screen, even if more input has arrived since, so a continuous burst
+    still shows progress; only that callback touches Tk objects. Input-to-pixel
+    latency, measured from the oldest submit not yet on screen, is therefore
+    bounded by the render in progress + max_wait_ms + one render + poll_ms, and
+    the measured percentiles are available from ``stats()``.
+    """
+
+    def __init__(self, root: Any, render: Callable[..., Any], on_ready: Callable[[Any], None],
+                 on_error: Optional[Callable[[Exception], None]] = None, debounce_ms: int = 25,
+                 max_wait_ms: int = 100, poll_ms: int = 8, history: int = 256):
+        self.root = root
+        self.render = render
+        self.on_ready = on_ready
+        self.on_error = on_error
+        self.debounce = debounce_ms / 1000
+        self.max_wait = max_wait_ms / 1000
+        self.poll_ms = poll_ms
+
+        self.submitted = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latencies: Deque[float] = deque(maxlen=history)
+
+        self._cond = threading.Condition()
+        self._pending: Optional[_Request] = None
+        self._result: Optional[tuple] = None
+        self._generation = 0
+        self._shown = 0  # generation of the frame on screen
+        # (generation, submitted at) of submits whose effect is not on screen yet
+        self._unserved: Deque[Tuple[int, float]] = deque()
+        self._busy = False
+        self._polling = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="preview-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, *args: Any) -> None:
+        with self._cond:
+            self._generation += 1
+            self.submitted += 1
+            self._pending = _Request(self._generation, args, time.perf_counter())
+            self._unserved.append((self._generation, self._pending.submitted_at))
+            self._cond.notify()
+        self._schedule_poll()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=1)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                # Debounce: wait until the stream of submits pauses, but never longer than max_wait
+                started = time.perf_counter()
+                while True:
+                    generation = self._pending.generation
+                    remaining = self.max_wait - (time.perf_counter() - started)
+                    self._cond.wait(timeout=max(0.0, min(self.debounce, remaining)))
+                    if self._stopped:
+                        return
+                    if self._pending.generation == generation or remaining <= self.debounce:
+                        break
+                request, self._pending = self._pending, None
+                self._busy = True
+
+            try:
+                outcome = (request, self.render(*request.args), None)
+            except Exception as e:
+                outcome = (request, None, e)
+
+            with self._cond:
+                self._busy = False
+                # Handed over even if newer input is waiting; the pending request is rendered next
+                if self._result is not None:
+                    # Never painted: the Tk thread did not poll before this newer frame finished
+                    self.dropped += 1
+                self._result = outcome
+
+    def _schedule_poll(self) -> None:
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self) -> None:
+        with self._cond:
+            outcome, self._result = self._result, None
+            in_flight = self._busy or self._pending is not None
+        if outcome is not None:
+            request, image, error = outcome
+            if error is not None and request.generation == self._generation:
+                self.failed += 1
+                self._served(request.generation, record=False)
+                if self.on_error is not None:
+                    self.on_error(error)
+            elif error is None and request.generation > self._shown:
+                self.on_ready(image)
+                self._shown = request.generation
+                self.rendered += 1
+                self._served(request.generation)
+            else:
+                self.dropped += 1
+        self._polling = False
+        if in_flight:
+            self._schedule_poll()
+
+    def _served(self, generation: int, record: bool = True) -> None:
+        # Latency counts from the oldest submit this frame answers, not from the latest one
+        oldest = None
+        with self._cond:
+            while self._unserved and self._unserved[0][0] <= generation:
+                submitted_at = self._unserved.popleft()[1]
+                oldest = submitted_at if oldest is None else oldest
+        if record and oldest is not None:
+            self.latencies.append(time.perf_counter() - oldest)
+
+    def stats(self) -> Dict[str, float]:
+        # Input-to-pixel latency: from the oldest submit not yet on screen to the frame reaching on_ready
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            "submitted": self.submitted,
+            "rendered": self.rendered,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "coalesced": self.submitted - self.rendered - self.dropped - self.failed,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": percentile(1.0),
+        }
@@ -0,0 +1,220 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+import masks
+from asset_cache import AssetCache, default_cache
+from camera_atlas import CAMERA_SPECS, MASK_SIZE, CameraAtlas, fit_mask, spec_mask
+from catalog import CATALOG_PATH, AssetCatalog, load_catalog
+from compositor import TIER_FULL, LayeredCompositor
+from import_store import make_proxy
+from instrumentation import CAMERA_MASK, stats
+from material_pyramid import PyramidStore
+
+PREVIEW_SIZE: Tuple[int, int] = (270, 540)
+LEGACY_ASSET_DIR = "images"
+
+
+@dataclass(frozen=True)
+class RenderSpec:
+    manufacturer: str = ""
+    model: str = ""
+    design: Optional[str] = None
+    material: Optional[str] = None
+    custom_image: Optional[str] = None
+    position: Tuple[int, int] = (0, 0)
+    scale: float = 1.0
+    size: Tuple[int, int] = PREVIEW_SIZE
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RenderSpec":
+        known = {f.name for f in fields(cls)}
+        values = {k: v for k, v in data.items() if k in known and v not in ("", None)}
+        # CSV rows give "x,y" / "WxH" strings, JSON gives lists
+        for name in ("position", "size"):
+            if isinstance(values.get(name), str):
+                values[name] = tuple(int(v) for v in values[name].replace("x", ",").split(","))
+            elif name in values:
+                values[name] = tuple(int(v) for v in values[name])
+        if "scale" in values:
+            values["scale"] = float(values["scale"])
+        for name in ("design", "material", "custom_image"):
+            if values.get(name) == "None":
+                values[name] = None
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def asset_path(name: Optional[str]) -> Optional[str]:
+    # Legacy flat layout, only tried for names the catalog does not know
+    if not name or name == "None":
+        return None
+    return f'{LEGACY_ASSET_DIR}/{name}.png'
+
+
+def load_custom_image(path: str, size: Tuple[int, int], cache: AssetCache = default_cache) -> Image.Image:
+    # Same preparation as the app's import: RGBA, thumbnailed to the canvas
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns, tuple(size), int(Image.LANCZOS), "thumbnail")
+    return cache.get_or_build(key, lambda: make_proxy(path, size))
+
+
+class CaseRenderer:
+    """Renders RenderSpecs without any UI; keeps one compositor per canvas size."""
+
+    def __init__(self, cache: AssetCache = default_cache, catalog: Optional[AssetCatalog] = None,
+                 camera_atlas: Optional[CameraAtlas] = None):
+        self.cache = cache
+        # Names resolve through the catalog; without one given the default index is loaded (and built)
+        self.catalog = catalog if catalog is not None else load_catalog()
+        # Without an atlas no camera cutouts are applied, as in the desktop preview
+        self.camera_atlas = camera_atlas
+        self._compositors: Dict[Tuple[int, int], LayeredCompositor] = {}
+        self._camera_masks: Dict[Tuple[str, Optional[str], Tuple[int, int]], Optional[Image.Image]] = {}
+
+    def compositor(self, size: Tuple[int, int]) -> LayeredCompositor:
+        size = tuple(size)
+        if size not in self._compositors:
+            self._compositors[size] = LayeredCompositor(size, self.cache)
+        return self._compositors[size]
+
+    def resolve(self, kind: str, name: Optional[str]) -> Optional[str]:
+        if not name or name == "None":
+            return None
+        return self.catalog.resolve(kind, name) or asset_path(name)
+
+    def camera_mask(self, model: str, design_path: Optional[str], size: Tuple[int, int]) -> Optional[Image.Image]:
+        # Atlas entry first, then the CAMERA_SPECS rectangles, then blob detection on the design.
+        # Kept per key so the compositor gets the same mask object and does not rebuild its base
+        key = (model, design_path, tuple(size))
+        if key not in self._camera_masks:
+            with stats.stage(CAMERA_MASK):
+                mask = self.camera_atlas.lookup(model, design_path)
+                if mask is None and model in CAMERA_SPECS:
+                    mask = spec_mask(CAMERA_SPECS[model])
+                if mask is not None:
+                    # Stored on the stretched square design; move it onto the crop-fitted layer
+                    source_size = (MASK_SIZE, MASK_SIZE)
+                    if design_path is not None:
+                        with Image.open(design_path) as design:
+                            source_size = design.size
+                    mask = fit_mask(mask, source_size, key[2])
+                elif design_path is not None:
+                    # Detected on the layer the compositor paints, so it lines up by construction
+                    compositor = self.compositor(key[2])
+                    mask = masks.camera_blob_mask(self.cache.get(design_path, key[2], compositor.resample))
+            if len(self._camera_masks) >= 256:
+                self._camera_masks.clear()
+            self._camera_masks[key] = mask
+        return self._camera_masks[key]
+
+    def render(self, spec: RenderSpec, custom_img: Optional[Image.Image] = None, tier: str = TIER_FULL) -> Image.Image:
+        # Returned images may be shared with the compositor's cache; copy before modifying
+        compositor = self.compositor(spec.size)
+        compositor.set_tier(tier)
+        if custom_img is None and spec.custom_image:
+            custom_img = load_custom_image(spec.custom_image, spec.size, self.cache)
+        design_path = self.resolve("design", spec.design)
+        compositor.set_design(design_path)
+        compositor.set_material(self.resolve("material", spec.material))
+        if self.camera_atlas is not None:
+            compositor.set_camera_mask(self.camera_mask(spec.model, design_path, spec.size))
+        compositor.set_custom_image(custom_img)
+        compositor.set_scale(spec.scale)
+        compositor.set_position(spec.position)
+        return compositor.render()
+
+
+_renderer: Optional[CaseRenderer] = None
+
+
+def render_case(spec: RenderSpec, custom_img: Optional[Image.Image] = None, tier: str = TIER_FULL) -> Image.Image:
+    global _renderer
+    if _renderer is None:
+        _renderer = CaseRenderer()
+    return _renderer.render(spec, custom_img, tier)
+
+
+def render_case_bytes(spec: RenderSpec) -> bytes:
+    # Raw RGBA buffer, row-major, spec.size[0] * spec.size[1] * 4 bytes
+    return render_case(spec).tobytes()
+
+
+def load_specs(path: str) -> List[Dict[str, Any]]:
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["orders"] if isinstance(data, dict) else data
+
+
+def output_name(index: int, spec: RenderSpec) -> str:
+    parts = [f"{index:05d}", spec.model, spec.design or "None", spec.material or "None"]
+    # Catalog design names carry their manufacturer folder ("Google/Pixel5_Design1")
+    parts = [re.sub(r"[\\/:]+", "-", part.replace(" ", "")) for part in parts]
+    return "_".join(parts) + ".png"
+
+
+def _init_worker(catalog_path: str) -> None:
+    # The parent refreshed the index already; workers only read it
+    global _renderer
+    _renderer = CaseRenderer(AssetCache(pyramids=PyramidStore()), AssetCatalog(catalog_path))
+
+
+def _render_job(job: Tuple[int, Dict[str, Any], str]) -> Tuple[int, str, Optional[str]]:
+    # Runs in a worker process; each worker keeps its own renderer and asset cache
+    index, data, out_dir = job
+    try:
+        spec = RenderSpec.from_dict(data)
+        path = os.path.join(out_dir, data.get("output") or output_name(index, spec))
+        render_case(spec).save(path)
+        return index, path, None
+    except Exception as e:
+        return index, "", f"{type(e).__name__}: {e}"
+
+
+def render_batch(orders: Iterable[Dict[str, Any]], out_dir: str, workers: Optional[int] = None,
+                 chunksize: int = 8, catalog_path: str = CATALOG_PATH) -> List[Tuple[int, str, Optional[str]]]:
+    os.makedirs(out_dir, exist_ok=True)
+    load_catalog(catalog_path)
+    jobs = [(index, order, out_dir) for index, order in enumerate(orders)]
+    if workers == 1:
+        _init_worker(catalog_path)
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(catalog_path,)) as pool:
+        return list(pool.map(_render_job, jobs, chunksize=chunksize))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render phone case proofs from a JSON or CSV list of order specs")
+    parser.add_argument("orders", help="JSON list (or {\"orders\": [...]}) or CSV file with RenderSpec fields")
+    parser.add_argument("-o", "--out-dir", default="proofs")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--size", help="Override the output size for every spec, e.g. 540x1080")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Asset catalog index used to resolve design and material names")
+    args = parser.parse_args(argv)
+
+    orders = load_specs(args.orders)
+    if args.size:
+        orders = [dict(order, size=args.size) for order in orders]
+    results = render_batch(orders, args.out_dir, args.workers, catalog_path=args.catalog)
+
+    failed = [(index, error) for index, _, error in results if error]
+    for index, error in failed:
+        print(f"Order {index}: {error}", file=sys.stderr)
+    print(f"Rendered {len(results) - len(failed)} of {len(results)} proofs into {args.out_dir}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
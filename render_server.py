@@ -0,0 +1,391 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from asset_cache import AssetCache
+from camera_atlas import ATLAS_PATH, CameraAtlas
+from catalog import CATALOG_PATH, ROOTS, AssetCatalog, load_catalog
+from import_store import IMPORTS_DIR, ImportStore
+from material_pyramid import PyramidStore
+from render import LEGACY_ASSET_DIR, CaseRenderer, RenderSpec
+
+CACHE_DIR = "render_cache"
+MAX_SIZE = 2048
+MAX_SCALE = 20.0
+# Directories a requested design or material may be read from
+ASSET_ROOTS: Tuple[str, ...] = (LEGACY_ASSET_DIR, ROOTS["design"], ROOTS["material"])
+
+_STATUS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _inside(path: str, roots: Tuple[str, ...]) -> bool:
+    real = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        if os.path.commonpath([real, root]) == root:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Encoded previews keyed by parameter hash: an LRU in memory in front of an LRU directory.
+
+    Both tiers are bounded in bytes. Disk files are named ``<digest>.png`` and
+    survive restarts; the oldest files are removed first once the budget is hit.
+    ``peek`` only looks in memory; ``get`` and ``put`` touch the disk and are
+    meant to run on a thread, so the bookkeeping is locked but file I/O is not.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with os.scandir(directory) as it:
+            files = sorted((e.stat().st_mtime_ns, e.name, e.stat().st_size) for e in it
+                           if e.is_file() and e.name.endswith(".png"))
+        for _, name, size in files:
+            self._disk[name[:-4]] = size
+            self.disk_bytes += size
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + ".png")
+
+    def peek(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._memory.get(digest)
+            if body is not None:
+                self._memory.move_to_end(digest)
+                self.hits += 1
+            return body
+
+    def get(self, digest: str) -> Optional[bytes]:
+        body = self.peek(digest)
+        if body is not None:
+            return body
+        with self._lock:
+            on_disk = digest in self._disk
+        if on_disk:
+            try:
+                with open(self._path(digest), "rb") as f:
+                    body = f.read()
+            except OSError:
+                with self._lock:
+                    self.disk_bytes -= self._disk.pop(digest, 0)
+            else:
+                with self._lock:
+                    if digest in self._disk:
+                        self._disk.move_to_end(digest)
+                    self._remember(digest, body)
+                    self.disk_hits += 1
+                return body
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, digest: str, body: bytes) -> None:
+        with self._lock:
+            self._remember(digest, body)
+            if digest in self._disk or len(body) > self.max_disk_bytes:
+                return
+        path = self._path(digest)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        evicted = []
+        with self._lock:
+            if digest not in self._disk:
+                self._disk[digest] = len(body)
+                self.disk_bytes += len(body)
+            while self.disk_bytes > self.max_disk_bytes:
+                old, size = self._disk.popitem(last=False)
+                self.disk_bytes -= size
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
+
+    def _remember(self, digest: str, body: bytes) -> None:
+        if digest in self._memory or len(body) > self.max_memory_bytes:
+            return
+        self._memory[digest] = body
+        self.memory_bytes += len(body)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self.memory_bytes -= len(old)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self.disk_bytes,
+            }
+
+
+def parse_spec(query: Dict[str, List[str]]) -> RenderSpec:
+    # ?manufacturer=&model=&design=&material=&custom=<import digest>&x=&y=&scale=&w=&h=
+    def value(name: str, default: str = "") -> str:
+        return query.get(name, [default])[0]
+
+    try:
+        position = (int(value("x", "0")), int(value("y", "0")))
+        scale = float(value("scale", "1"))
+        size = (int(value("w", "270")), int(value("h", "540")))
+    except ValueError as e:
+        raise RequestError(400, f"Invalid number: {e}")
+    if not (0 < size[0] <= MAX_SIZE and 0 < size[1] <= MAX_SIZE):
+        raise RequestError(400, f"Size must be between 1 and {MAX_SIZE} pixels per side")
+    if not 0 < scale <= MAX_SCALE:
+        raise RequestError(400, f"Scale must be between 0 and {MAX_SCALE}")
+    return RenderSpec.from_dict({
+        "manufacturer": value("manufacturer"),
+        "model": value("model"),
+        "design": value("design"),
+        "material": value("material"),
+        "custom_image": value("custom"),
+        "position": position,
+        "scale": scale,
+        "size": size,
+    })
+
+
+_renderer: Optional[CaseRenderer] = None
+
+
+def _init_worker(catalog_path: str, atlas_path: str, cache_bytes: int) -> None:
+    global _renderer
+    _renderer = CaseRenderer(AssetCache(cache_bytes, PyramidStore()), AssetCatalog(catalog_path),
+                             CameraAtlas(atlas_path))
+
+
+def _render_png(data: Dict[str, Any]) -> bytes:
+    # Runs in a worker process; the renderer keeps its compositors and asset cache between requests
+    image = _renderer.render(RenderSpec.from_dict(data))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", compress_level=3)
+    return buffer.getvalue()
+
+
+class RenderServer:
+    """Local HTTP endpoint returning finished case previews as PNG.
+
+    ``GET /render`` takes the parameters of ``parse_spec``; ``GET /stats``
+    reports cache counters. Identical parameters (and unchanged asset files)
+    give the same hash, which is the ETag, the cache key and the disk file
+    name. Concurrent requests for the same hash share a single render.
+    """
+
+    def __init__(self, cache: ResponseCache, pool: ProcessPoolExecutor, catalog: Optional[AssetCatalog] = None,
+                 imports: Optional[ImportStore] = None, asset_roots: Tuple[str, ...] = ASSET_ROOTS,
+                 atlas_path: str = ATLAS_PATH):
+        self.cache = cache
+        self.pool = pool
+        # Workers load the atlas once at startup, so its mtime then goes into every key; a rebuilt
+        # atlas takes effect on restart and never serves responses cached from the old one
+        try:
+            self.atlas_stamp = os.stat(atlas_path).st_mtime_ns
+        except OSError:
+            self.atlas_stamp = 0
+        self.resolver = CaseRenderer(catalog=catalog)
+        self.catalog = self.resolver.catalog
+        self.asset_roots = asset_roots
+        self.imports = imports or ImportStore()
+        self.rendered = 0
+        self.failed = 0
+        self._inflight: Dict[str, "asyncio.Future[bytes]"] = {}
+
+    def resolve(self, spec: RenderSpec) -> Tuple[RenderSpec, str]:
+        # Hash the resolved paths together with the files' mtimes, so an edited asset gets a
+        # new ETag instead of a stale cached response. Workers resolve names the same way
+        paths = {}
+        for kind, name in (("design", spec.design), ("material", spec.material)):
+            in_catalog = self.catalog.resolve(kind, name) is not None
+            # Any page can call this, and names outside the catalog become a path under images/
+            if name and not in_catalog and ("/" in name or "\\" in name or ".." in name):
+                raise RequestError(400, f"Invalid {kind} name: {name}")
+            path = self.resolver.resolve(kind, name)
+            if path is not None and not (os.path.isfile(path) and _inside(path, self.asset_roots)):
+                raise RequestError(404, f"Unknown {kind}: {name}")
+            paths[kind] = path
+        custom_path = None
+        if spec.custom_image:
+            record = self.imports.get(spec.custom_image)
+            if record is None and self.imports.reload_if_changed():
+                record = self.imports.get(spec.custom_image)
+            if record is None:
+                raise RequestError(404, f"Unknown custom image: {spec.custom_image}")
+            custom_path = self.imports.original_path(record)
+        data = dict(spec.to_dict(), custom_image=custom_path)
+        stamps = {kind: [path, os.stat(path).st_mtime_ns if path else 0] for kind, path in paths.items()}
+        key = json.dumps([data, stamps, self.atlas_stamp], sort_keys=True)
+        return RenderSpec.from_dict(data), hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    async def render(self, spec: RenderSpec, digest: str) -> bytes:
+        body = self.cache.peek(digest)
+        if body is not None:
+            return body
+        future = self._inflight.get(digest)
+        if future is not None:
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[digest] = future
+        try:
+            # The disk tier is read and written on the default thread pool, never on the loop
+            body = await loop.run_in_executor(None, self.cache.get, digest)
+            if body is None:
+                body = await loop.run_in_executor(self.pool, _render_png, spec.to_dict())
+                await loop.run_in_executor(None, self.cache.put, digest, body)
+                self.rendered += 1
+            future.set_result(body)
+            return body
+        except Exception as e:
+            self.failed += 1
+            future.set_exception(e)
+            # Waiters retrieve the exception; nobody else needs to
+            future.exception()
+            raise
+        finally:
+            del self._inflight[digest]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, header_value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = header_value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, b"Malformed request line", close=True)
+                    break
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+                await self.dispatch(writer, method, target, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, writer: asyncio.StreamWriter, method: str, target: str, headers: Dict[str, str],
+                       keep_alive: bool) -> None:
+        if method not in ("GET", "HEAD"):
+            await self.respond(writer, 405, b"Only GET and HEAD are supported", keep_alive, {"Allow": "GET, HEAD"})
+            return
+        url = urlsplit(target)
+        if url.path == "/stats":
+            body = json.dumps(dict(self.cache.stats(), rendered=self.rendered, failed=self.failed)).encode()
+            await self.respond(writer, 200, body, keep_alive, {"Content-Type": "application/json"}, method == "HEAD")
+            return
+        if url.path != "/render":
+            await self.respond(writer, 404, b"Not found", keep_alive)
+            return
+        try:
+            spec, digest = self.resolve(parse_spec(parse_qs(url.query)))
+            etag = f'"{digest}"'
+            extra = {"ETag": etag, "Cache-Control": "no-cache"}
+            if etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]:
+                await self.respond(writer, 304, b"", keep_alive, extra)
+                return
+            body = await self.render(spec, digest)
+        except RequestError as e:
+            await self.respond(writer, e.status, str(e).encode(), keep_alive)
+            return
+        except Exception as e:
+            await self.respond(writer, 500, f"{type(e).__name__}: {e}".encode(), keep_alive)
+            return
+        extra["Content-Type"] = "image/png"
+        await self.respond(writer, 200, body, keep_alive, extra, method == "HEAD")
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, body: bytes, keep_alive: bool = False,
+                      headers: Optional[Dict[str, str]] = None, head_only: bool = False, close: bool = False) -> None:
+        headers = dict(headers or {})
+        headers.setdefault("Content-Type", "text/plain; charset=utf-8")
+        # The shop page is served from elsewhere and draws the result onto its canvas
+        headers["Access-Control-Allow-Origin"] = "*"
+        headers["Access-Control-Expose-Headers"] = "ETag"
+        headers["Content-Length"] = str(len(body))
+        headers["Connection"] = "keep-alive" if keep_alive and not close else "close"
+        head = f"HTTP/1.1 {status} {_STATUS[status]}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n")
+        if not head_only and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, server: RenderServer) -> None:
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving previews on http://{host}:{port}/render")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local HTTP render service for the web front-end")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Asset catalog index used to resolve design and material names")
+    parser.add_argument("--atlas", default=ATLAS_PATH, help="Camera mask atlas")
+    parser.add_argument("--imports", default=IMPORTS_DIR, help="Import store holding custom images")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--memory-mb", type=int, default=64, help="In-memory response cache budget")
+    parser.add_argument("--disk-mb", type=int, default=512, help="On-disk response cache budget")
+    parser.add_argument("--worker-cache-mb", type=int, default=64, help="Decoded asset cache per worker process")
+    args = parser.parse_args(argv)
+
+    cache = ResponseCache(args.cache_dir, args.memory_mb * 1024 * 1024, args.disk_mb * 1024 * 1024)
+    catalog = load_catalog(args.catalog)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.catalog, args.atlas, args.worker_cache_mb * 1024 * 1024)) as pool:
+        server = RenderServer(cache, pool, catalog, ImportStore(args.imports), atlas_path=args.atlas)
+        try:
+            asyncio.run(serve(args.host, args.port, server))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from asset_cache import AssetCache
+from benchmarks.synthetic import synthetic_design, synthetic_material, synthetic_photo
+from compositor import CUSTOM, DESIGN, MATERIAL, TIER_DRAFT, TIER_FULL, LayeredCompositor
+
+SIZE = (54, 108)
+
+
+@pytest.fixture
+def compositor(tmp_path):
+    design_path = str(tmp_path / "design.png")
+    material_path = str(tmp_path / "material.png")
+    synthetic_design((60, 120)).save(design_path)
+    synthetic_material((60, 120)).save(material_path)
+    compositor = LayeredCompositor(SIZE, AssetCache())
+    compositor.set_design(design_path)
+    compositor.set_material(material_path)
+    compositor.set_custom_image(synthetic_photo((80, 60)))
+    compositor.render()
+    assert compositor.last_rebuilt == (DESIGN, MATERIAL, CUSTOM)
+    return compositor
+
+
+def test_move_only_reblits(compositor):
+    before = compositor.render()
+    compositor.set_position((5, 10))
+    frame = compositor.render()
+    assert compositor.last_rebuilt == ()
+    assert frame is not before
+
+
+def test_zoom_resamples_only_the_custom_layer(compositor):
+    compositor.set_scale(1.5)
+    compositor.render()
+    assert compositor.last_rebuilt == (CUSTOM,)
+
+
+def test_tier_switch_keeps_one_layer_per_tier(compositor):
+    compositor.set_tier(TIER_DRAFT)
+    compositor.render()
+    assert compositor.last_rebuilt == (CUSTOM,)
+    compositor.set_tier(TIER_FULL)
+    compositor.render()
+    assert compositor.last_rebuilt == ()
+    compositor.set_tier(TIER_DRAFT)
+    compositor.render()
+    assert compositor.last_rebuilt == ()
+
+
+def test_unchanged_inputs_rebuild_nothing(compositor):
+    frame = compositor.render()
+    compositor.set_design(compositor.design_path)
+    compositor.set_material(compositor.material_path)
+    assert compositor.render() is frame
+    assert compositor.last_rebuilt == ()
+
+
+def test_asset_edited_on_disk_is_rebuilt(compositor):
+    stat = os.stat(compositor.material_path)
+    synthetic_material((60, 120), seed=5).save(compositor.material_path)
+    os.utime(compositor.material_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    compositor.set_material(compositor.material_path)
+    compositor.render()
+    assert compositor.last_rebuilt == (MATERIAL,)
+
+    stat = os.stat(compositor.design_path)
+    os.utime(compositor.design_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    compositor.set_design(compositor.design_path)
+    compositor.render()
+    assert compositor.last_rebuilt == (DESIGN, MATERIAL)
@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmarks.synthetic import synthetic_design, synthetic_material, synthetic_photo
+from export import TiledRenderer, write_png, write_tiff
+from render import RenderSpec
+
+
+def _bands(image, rows):
+    for y in range(0, image.height, rows):
+        yield image.crop((0, y, image.width, min(image.height, y + rows)))
+
+
+def _noise(size, mode, seed=0):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], len(mode)), dtype=np.uint8), mode)
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "RGB"])
+def test_png_round_trip(mode):
+    # Several bands, the last one shorter, so scanlines cross IDAT chunk boundaries
+    image = _noise((37, 101), mode)
+    out = io.BytesIO()
+    write_png(out, image.size, _bands(image, 16), mode, 300)
+    out.seek(0)
+    with Image.open(out) as decoded:
+        assert decoded.mode == mode
+        assert decoded.size == image.size
+        assert decoded.info["dpi"] == pytest.approx((300, 300), abs=0.01)
+        assert decoded.tobytes() == image.tobytes()
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "RGB"])
+@pytest.mark.parametrize("rows_per_strip", [16, 128])
+def test_tiff_round_trip(mode, rows_per_strip):
+    # 101 rows give seven strips with a short last one, or a single strip
+    image = _noise((37, 101), mode, seed=1)
+    out = io.BytesIO()
+    write_tiff(out, image.size, _bands(image, rows_per_strip), mode, 600, rows_per_strip)
+    out.seek(0)
+    with Image.open(out) as decoded:
+        assert decoded.mode == mode
+        assert decoded.size == image.size
+        assert decoded.info["dpi"] == pytest.approx((600, 600))
+        assert decoded.tobytes() == image.tobytes()
+
+
+def test_tiles_join_without_seams(tmp_path):
+    design_path = str(tmp_path / "design.png")
+    material_path = str(tmp_path / "material.png")
+    photo_path = str(tmp_path / "photo.png")
+    synthetic_design((300, 500)).save(design_path)
+    synthetic_material((280, 460)).save(material_path)
+    synthetic_photo((400, 300)).save(photo_path)
+    spec = RenderSpec(design=design_path, material=material_path, position=(40, 70), size=(270, 540))
+    renderer = TiledRenderer(spec, (177, 354), lambda kind, name: name, photo_path)
+
+    whole = renderer.render_tile((0, 0) + renderer.size)
+    tiled = Image.new("RGBA", renderer.size)
+    for index, band in enumerate(renderer.bands(tile_size=64)):
+        tiled.paste(band, (0, index * 64))
+    # Resampling a sub-box rounds filter weights slightly differently; a seam would be far off
+    difference = np.abs(np.asarray(whole, dtype=np.int16) - np.asarray(tiled, dtype=np.int16))
+    assert difference.max() <= 1
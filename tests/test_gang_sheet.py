@@ -0,0 +1,80 @@
+import random
+from collections import Counter
+
+from PIL import Image
+
+from gang_sheet import Deduplicator, pack
+from import_store import ImportStore
+from render import RenderSpec
+
+
+def _check_layout(items, sheets, sheet_size, gap):
+    width, height = sheet_size
+    for placements in sheets:
+        for p in placements:
+            assert gap <= p.x and p.x + p.width + gap <= width
+            assert gap <= p.y and p.y + p.height + gap <= height
+        for i, a in enumerate(placements):
+            for b in placements[i + 1:]:
+                assert (a.x + a.width <= b.x or b.x + b.width <= a.x
+                        or a.y + a.height <= b.y or b.y + b.height <= a.y), (a, b)
+    placed = Counter(p.key for placements in sheets for p in placements)
+    assert placed == Counter({key: count for key, _, _, count in items})
+    sizes = {key: (w, h) for key, w, h, _ in items}
+    assert all((p.width, p.height) == sizes[p.key] for placements in sheets for p in placements)
+
+
+def test_mixed_sizes_fill_three_sheets():
+    # Two rows of two 40x40 fill the first sheet; the fifth copy opens a second one, which the
+    # shorter cases share before the last of them opens a third
+    items = [("tall", 40, 40, 5), ("short", 20, 30, 6)]
+    sheets = pack(items, (100, 100), 5)
+    _check_layout(items, sheets, (100, 100), 5)
+    assert len(sheets) == 3
+    assert [p.key for p in sheets[1]] == ["tall"] + ["short"] * 5
+
+
+def test_random_batches_keep_every_placement_valid():
+    rng = random.Random(7)
+    for _ in range(20):
+        items = [(f"c{i}", rng.randint(20, 90), rng.randint(20, 140), rng.randint(1, 12)) for i in range(rng.randint(1, 15))]
+        sheets = pack(items, (320, 450), 3)
+        _check_layout(items, sheets, (320, 450), 3)
+        assert all(sheets)
+
+
+def test_empty_batch_needs_no_sheets():
+    assert pack([], (100, 100), 5) == []
+
+
+def _assets(tmp_path):
+    paths = {}
+    for name, color in (("Flowers", "red"), ("Leder", "brown"), ("photo", "blue")):
+        paths[name] = str(tmp_path / f"{name}.png")
+        Image.new("RGBA", (8, 8), color).save(paths[name])
+    return paths
+
+
+def test_identical_compositions_collapse_across_models(tmp_path):
+    paths = _assets(tmp_path)
+    dedup = Deduplicator(lambda kind, name: paths.get(name), ImportStore(str(tmp_path / "imports")))
+    first = dedup.add(RenderSpec("Apple", "iPhone 13", "Flowers", "Leder"), 2)
+    second = dedup.add(RenderSpec("Google", "Pixel 5", "Flowers", "Leder"), 3)
+    # Without a custom image there is nothing to place, so the transform does not matter either
+    third = dedup.add(RenderSpec("Apple", "iPhone 13", "Flowers", "Leder", position=(10, 20), scale=1.5))
+    assert first is second is third
+    assert first.quantity == 6
+    assert first.models == ["Apple iPhone 13", "Google Pixel 5"]
+    assert len(dedup.compositions) == 1
+
+
+def test_custom_image_placement_separates_compositions(tmp_path):
+    paths = _assets(tmp_path)
+    dedup = Deduplicator(lambda kind, name: paths.get(name), ImportStore(str(tmp_path / "imports")))
+    base = RenderSpec("Apple", "iPhone 13", "Flowers", "Leder", custom_image=paths["photo"])
+    a = dedup.add(base)
+    b = dedup.add(RenderSpec("Samsung", "Galaxy S21", "Flowers", "Leder", custom_image=paths["photo"]))
+    c = dedup.add(RenderSpec("Apple", "iPhone 13", "Flowers", "Leder", custom_image=paths["photo"], position=(10, 20)))
+    assert a is b
+    assert c is not a
+    assert len(dedup.compositions) == 2
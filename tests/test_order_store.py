@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from order_store import OrderError, OrderLine, OrderStore
+
+
+def _line(model="iPhone 13", design="Flowers", material="Leder", quantity=1, manufacturer="Apple", **kwargs):
+    return OrderLine("kunde@example.com", manufacturer, model, design, material, quantity, **kwargs)
+
+
+def _committed_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM order_lines").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_lines_are_written_in_batches(tmp_path):
+    path = str(tmp_path / "orders.sqlite3")
+    store = OrderStore(path, batch_size=3)
+    store.add_many(_line(quantity=i + 1) for i in range(7))
+    # Two full batches are committed, the seventh line waits for the next batch or a flush
+    assert _committed_rows(path) == 6
+    assert store.count() == 7
+    assert _committed_rows(path) == 7
+    store.close()
+
+    with OrderStore(path) as reopened:
+        assert [line.quantity for line in reopened.lines()] == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_close_flushes_pending_lines(tmp_path):
+    path = str(tmp_path / "orders.sqlite3")
+    with OrderStore(path) as store:
+        store.add(_line())
+    assert _committed_rows(path) == 1
+
+
+def test_lines_round_trip_every_field(tmp_path):
+    line = _line(custom_image="ab" * 32, position_x=12, position_y=-40, scale=1.5, created_at=1700000000.0)
+    with OrderStore(str(tmp_path / "orders.sqlite3")) as store:
+        store.add(line)
+        assert store.lines() == [line]
+
+
+def test_totals_group_and_filter(tmp_path):
+    with OrderStore(str(tmp_path / "orders.sqlite3")) as store:
+        store.add_many([
+            _line("iPhone 13", "Flowers", "Leder", 2),
+            _line("iPhone 13", "Stripes", "Holz", 5),
+            _line("Pixel 5", "Flowers", "Leder", 4, manufacturer="Google"),
+            _line("Pixel 5", "Flowers", "Kork", 1, manufacturer="Google"),
+        ])
+        assert store.totals() == [("Apple iPhone 13", 2, 7), ("Google Pixel 5", 2, 5)]
+        assert store.totals("design") == [("Flowers", 3, 7), ("Stripes", 1, 5)]
+        assert store.totals("material", design="Flowers") == [("Leder", 2, 6), ("Kork", 1, 1)]
+        assert store.totals("design", model="Pixel 5", material=None) == [("Flowers", 2, 5)]
+
+
+def test_lines_filter_and_limit(tmp_path):
+    with OrderStore(str(tmp_path / "orders.sqlite3")) as store:
+        store.add_many(_line(design=design, quantity=i + 1) for i, design in enumerate(["A", "B", "A", "A"]))
+        assert [line.quantity for line in store.lines(design="A")] == [1, 3, 4]
+        assert [line.quantity for line in store.lines(limit=2, design="A")] == [1, 3]
+        assert [line.quantity for line in store.lines(manufacturer="Apple", design="B")] == [2]
+
+
+def test_unknown_fields_are_rejected(tmp_path):
+    with OrderStore(str(tmp_path / "orders.sqlite3")) as store:
+        with pytest.raises(OrderError):
+            store.totals("quantity")
+        with pytest.raises(OrderError):
+            store.lines(custom_image="x")
+
+
+@pytest.mark.parametrize("line", [
+    OrderLine("not-an-email", "Apple", "iPhone 13", "Flowers", "Leder"),
+    OrderLine("kunde@example.com", "", "iPhone 13", "Flowers", "Leder"),
+    OrderLine("kunde@example.com", "Apple", "", "Flowers", "Leder"),
+    OrderLine("kunde@example.com", "Apple", "iPhone 13", "Flowers", "Leder", quantity=0),
+])
+def test_invalid_lines_are_not_stored(tmp_path, line):
+    with OrderStore(str(tmp_path / "orders.sqlite3")) as store:
+        with pytest.raises(OrderError):
+            store.add(line)
+        assert store.count() == 0
@@ -0,0 +1,69 @@
+import heapq
+import itertools
+import time
+
+from preview_worker import PreviewWorker
+
+
+class FakeRoot:
+    """Stands in for Tk: ``after`` callbacks run from ``run_until`` on the test thread."""
+
+    def __init__(self):
+        self._queue = []
+        self._ids = itertools.count()
+
+    def after(self, ms, func, *args):
+        heapq.heappush(self._queue, (time.perf_counter() + ms / 1000, next(self._ids), func, args))
+
+    def run_until(self, deadline):
+        while time.perf_counter() < deadline:
+            if self._queue and self._queue[0][0] <= time.perf_counter():
+                _, _, func, args = heapq.heappop(self._queue)
+                func(*args)
+            else:
+                time.sleep(0.001)
+
+
+def slow_render(value):
+    time.sleep(0.03)
+    return value
+
+
+def test_frames_arrive_during_a_sustained_burst():
+    root = FakeRoot()
+    shown = []
+    worker = PreviewWorker(root, slow_render, lambda frame: shown.append((time.perf_counter(), frame)),
+                           debounce_ms=25, max_wait_ms=100)
+    try:
+        burst_start = time.perf_counter()
+        for value in range(50):
+            worker.submit(value)
+            root.run_until(time.perf_counter() + 0.04)
+        burst_end = time.perf_counter()
+        root.run_until(burst_end + 0.3)
+    finally:
+        worker.stop()
+
+    during_burst = [frame for at, frame in shown if at < burst_end]
+    assert len(during_burst) >= 10
+    # Frames only move forward and the last input is what ends up on screen
+    frames = [frame for _, frame in shown]
+    assert frames == sorted(frames)
+    assert frames[-1] == 49
+    assert burst_end - burst_start > 1.5
+    # Render in progress + max_wait + one render + poll, with room for a loaded machine
+    assert worker.stats()["latency_p95_ms"] < 400
+
+
+def test_single_submit_is_rendered_once():
+    root = FakeRoot()
+    shown = []
+    worker = PreviewWorker(root, slow_render, shown.append)
+    try:
+        worker.submit("frame")
+        root.run_until(time.perf_counter() + 0.3)
+    finally:
+        worker.stop()
+    assert shown == ["frame"]
+    stats = worker.stats()
+    assert stats["rendered"] == 1 and stats["dropped"] == 0